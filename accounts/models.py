@@ -9,9 +9,10 @@ from django.db.models.signals import pre_save, post_save
 from django.utils import timezone as tz
 from django.utils.translation import gettext as _
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
-from thumbnails.fields import ImageField
+from fincapes.images import ImageField, ThumbnailQuerySetMixin
+from fincapes.timezones import LocalDateQuerySetMixin, get_user_timezone
 from fincapes.utils import (
-    unique_id_generator, unique_key_generator,
+    unique_id_generator, unique_key_generator, assign_unique_ids, check_key_valid,
     get_date_time_local, get_due_date_time, saved_directory_path
 )
 from fincapes.variables import (
@@ -65,6 +66,10 @@ class UserManager(BaseUserManager):
         profile.save(using=self._db)
         return profile
 
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = assign_unique_ids(list(objs))
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 class User(AbstractBaseUser):
     email = models.EmailField(max_length=45, unique=True)
@@ -74,7 +79,7 @@ class User(AbstractBaseUser):
     is_active = models.BooleanField(default=True)
     staff = models.BooleanField(default=False)
     admin = models.BooleanField(default=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     updated = models.DateTimeField(auto_now=True)
     is_profile_filled = models.BooleanField(_('Profile Filled'), default=False)
     has_password_changed = models.BooleanField(default=False)
@@ -122,12 +127,16 @@ class User(AbstractBaseUser):
     #     return True
 
 
-class EmailActivationQueryset(models.query.QuerySet):
+class EmailActivationQueryset(LocalDateQuerySetMixin, models.query.QuerySet):
+    def with_profile(self):
+        # get_due_date reads the profile timezone
+        return self.select_related('user__profile')
+
     def confirmable(self):
         now = tz.now()
         start_range = now - timedelta(days=DEFAULT_ACTIVATION_DAYS)
         end_range = now
-        return self.filter(
+        return self.with_profile().filter(
             activated=False, force_expired=False
         ).filter(
             timestamp__gt=start_range, timestamp__lte=end_range
@@ -138,9 +147,23 @@ class EmailActivationManager(models.Manager):
     def get_queryset(self):
         return EmailActivationQueryset(self.model, using=self._db)
 
+    def with_profile(self):
+        return self.get_queryset().with_profile()
+
     def confirmable(self):
         return self.get_queryset().confirmable()
 
+    def count_by_local_date(self, field=None, tzinfo=None):
+        return self.get_queryset().count_by_local_date(field, tzinfo)
+
+    def get_by_key(self, key):
+        max_age = timedelta(days=DEFAULT_ACTIVATION_DAYS)
+        if check_key_valid(key, max_age=max_age) is None:
+            return None
+        return self.get_queryset().with_profile().filter(
+            key=key, activated=False, force_expired=False
+        ).first()
+
     def email_exists(self, email):
         return self.get_queryset().filter(
             Q(email=email) | Q(user__email=email)
@@ -150,21 +173,31 @@ class EmailActivationManager(models.Manager):
 class EmailActivation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     email = models.EmailField()
-    key = models.CharField(max_length=120, blank=True, null=True)
+    key = models.CharField(max_length=120, blank=True, null=True, db_index=True)
     activated = models.BooleanField(default=False)
     force_expired = models.BooleanField(default=False)
     expires = models.SmallIntegerField(default=DEFAULT_ACTIVATION_DAYS)
     timestamp = models.DateTimeField(auto_now_add=True)
     update = models.DateTimeField(auto_now=True)
+    activated_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
 
     objects = EmailActivationManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['activated', 'force_expired', 'timestamp']),
+        ]
+
     def __str__(self):
         return str(self.email)
 
     def can_activate(self):
-        qs = EmailActivation.objects.filter(pk=self.pk).confirmable()
-        return True if qs.exists() else False
+        if self.activated or self.force_expired or self.timestamp is None:
+            return False
+        max_age = timedelta(days=self.expires)
+        if tz.now() - self.timestamp > max_age:
+            return False
+        return check_key_valid(self.key, max_age=max_age) is not None
 
     def activate(self):
         if self.can_activate():
@@ -185,7 +218,7 @@ class EmailActivation(models.Model):
 
     @property
     def get_due_date(self):
-        local_date = get_date_time_local(self.timestamp, 'Asia/Jakarta')
+        local_date = get_date_time_local(self.timestamp, get_user_timezone(self.user))
         return get_due_date_time(local_date, self.expires)
 
     def send_activation(self):
@@ -204,6 +237,8 @@ class EmailActivation(models.Model):
 
 
 def pre_save_email_activation(sender, instance, *args, **kwargs):
+    if instance.activated and instance.activated_at is None:
+        instance.activated_at = tz.now()
     if not instance.activated and not instance.force_expired:
         if not instance.key:
             instance.key = unique_key_generator(instance)
@@ -212,7 +247,7 @@ def pre_save_email_activation(sender, instance, *args, **kwargs):
 pre_save.connect(pre_save_email_activation, sender=EmailActivation)
 
 
-class ProfileQuerySet(models.query.QuerySet):
+class ProfileQuerySet(ThumbnailQuerySetMixin, models.query.QuerySet):
     def recent(self):
         return self.order_by('-updated')
 
@@ -221,6 +256,13 @@ class ProfileManager(models.Manager):
     def get_queryset(self):
         return ProfileQuerySet(self.model, using=self._db)
 
+    def with_thumbnails(self, *sizes):
+        return self.get_queryset().with_thumbnails(*sizes)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = assign_unique_ids(list(objs))
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, blank=True, null=True)
@@ -295,4 +337,14 @@ def pre_save_user_profile_create(sender, instance, *args, **kwargs):
         instance.uid = unique_id_generator(instance)
 
 
-pre_save.connect(pre_save_user_profile_create, sender=Profile)
\ No newline at end of file
+pre_save.connect(pre_save_user_profile_create, sender=Profile)
+
+
+def post_save_user_profile(sender, instance, *args, **kwargs):
+    # Touch the user's ``updated`` stamp so the language cached in the
+    # session by DefaultLanguageMiddleware is resolved again.
+    if instance.user_id:
+        User.objects.filter(pk=instance.user_id).update(updated=tz.now())
+
+
+post_save.connect(post_save_user_profile, sender=Profile)
@@ -1,3 +1,120 @@
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import RequestFactory, TestCase
+from django.utils import timezone, translation
+from fincapes.middleware import DefaultLanguageMiddleware, TimezoneMiddleware
+from fincapes.reports import get_report_timezone
+from fincapes.timezones import get_zone
+from .models import User, Profile, EmailActivation
 
-# Create your tests here.
+
+class DefaultLanguageMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user@fincapes.com', first_name='User', password='secret')
+        self.user.profile.save_language('id')
+        self.session = SessionStore()
+        self.middleware = DefaultLanguageMiddleware(lambda request: None)
+        self.addCleanup(translation.deactivate)
+
+    def get_request(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        request.session = self.session
+        return request
+
+    def test_language_is_resolved_once(self):
+        request = self.get_request()
+        with self.assertNumQueries(1):
+            self.middleware.process_request(request)
+        self.assertEqual(request.LANGUAGE_CODE, 'id')
+
+        request = self.get_request()
+        with self.assertNumQueries(0):
+            self.middleware.process_request(request)
+        self.assertEqual(request.LANGUAGE_CODE, 'id')
+
+    def test_profile_save_invalidates_language(self):
+        self.middleware.process_request(self.get_request())
+        User.objects.get(pk=self.user.pk).profile.save_language('en')
+
+        request = self.get_request()
+        with self.assertNumQueries(1):
+            self.middleware.process_request(request)
+        self.assertEqual(request.LANGUAGE_CODE, 'en')
+
+
+class TimezoneMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user@fincapes.com', first_name='User', password='secret')
+        profile = self.user.profile
+        profile.timezone = 'America/Toronto'
+        profile.save()
+        self.session = SessionStore()
+        self.middleware = TimezoneMiddleware(lambda request: None)
+        self.addCleanup(timezone.deactivate)
+
+    def get_request(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        request.session = self.session
+        return request
+
+    def test_profile_timezone_is_activated_once(self):
+        request = self.get_request()
+        with self.assertNumQueries(1):
+            self.middleware.process_request(request)
+        self.assertEqual(timezone.get_current_timezone_name(), 'America/Toronto')
+
+        second = self.get_request()
+        with self.assertNumQueries(0):
+            self.middleware.process_request(second)
+        self.middleware.process_response(request, None)
+        self.assertEqual(timezone.get_current_timezone_name(), 'UTC')
+
+    def test_anonymous_users_get_default_timezone(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = self.session
+        self.middleware.process_request(request)
+        self.assertEqual(request.timezone.key, 'Asia/Jakarta')
+        self.assertEqual(get_report_timezone(request.user).key, 'Asia/Jakarta')
+        self.assertEqual(get_zone('Not/AZone').key, 'Asia/Jakarta')
+
+
+class UniqueIdTest(TestCase):
+    def test_bulk_create_assigns_uid_without_lookups(self):
+        with self.assertNumQueries(1):
+            profiles = Profile.objects.bulk_create([Profile() for _ in range(50)])
+        uids = {profile.uid for profile in profiles}
+        self.assertEqual(len(uids), 50)
+        self.assertTrue(all(len(uid) == 40 for uid in uids))
+
+    def test_bulk_created_users_get_uids(self):
+        with self.assertNumQueries(1):
+            users = User.objects.bulk_create([User(email=f'user{i}@fincapes.com') for i in range(3)])
+        self.assertEqual(len({user.uid for user in users}), 3)
+
+
+class EmailActivationTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('user@fincapes.com', first_name='User', is_active=False)
+        self.activation = EmailActivation.objects.create(user=user, email=user.email)
+
+    def test_key_is_verified_without_table_scan(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(self.activation.can_activate())
+        with self.assertNumQueries(0):
+            self.assertIsNone(EmailActivation.objects.get_by_key(self.activation.key + 'x'))
+        with self.assertNumQueries(1):
+            self.assertEqual(EmailActivation.objects.get_by_key(self.activation.key), self.activation)
+
+    def test_due_date_uses_loaded_profile(self):
+        activations = list(EmailActivation.objects.confirmable())
+        with self.assertNumQueries(0):
+            self.assertTrue(activations[0].get_due_date)
+
+    def test_regenerate_issues_new_key(self):
+        key = self.activation.key
+        self.assertTrue(self.activation.regenerate())
+        self.assertNotEqual(self.activation.key, key)
+        self.assertIsNone(EmailActivation.objects.get_by_key(key))
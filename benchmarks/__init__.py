@@ -0,0 +1,55 @@
+import os
+import statistics
+import tempfile
+import time
+
+
+def setup(db_name='bench.sqlite3', directory=None, database=None, migrate=True):
+    # Run against a throwaway SQLite file so the project database is untouched.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fincapes.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    from django.conf import settings
+    directory = directory or tempfile.mkdtemp(prefix='fincapes-bench-')
+    settings.DATABASES['default'].update(database or {})
+    settings.DATABASES['default']['NAME'] = os.path.join(directory, db_name)
+    settings.MEDIA_ROOT = os.path.join(directory, 'media')
+    django.setup()
+    if migrate:
+        from django.core.management import call_command
+        call_command('migrate', run_syncdb=True, verbosity=0)
+        call_command('createcachetable', verbosity=0)
+    return directory
+
+
+def timeit(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def report(label, seconds):
+    print(f'{label:<45} {seconds * 1000:>10.2f} ms')
+
+
+def memory_status(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+
+def reset_peak_rss():
+    # ru_maxrss survives fork/exec on Linux, so reset the high-water mark of
+    # this process and read it from /proc instead
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    return memory_status('VmRSS')
+
+
+def peak_rss_growth(before):
+    """MiB the peak RSS grew since ``before = reset_peak_rss()``."""
+    return (memory_status('VmHWM') - before) / 1024
@@ -0,0 +1,39 @@
+"""
+Compare the plain DatabaseCache with the two-tier cache on a read-heavy
+workload (10 reads per write over a small hot key set).
+
+    python -m benchmarks.cache
+"""
+import random
+from benchmarks import setup, timeit, report
+
+KEYS = 200
+OPERATIONS = 20_000
+
+
+def workload(cache):
+    rand = random.Random(1)
+    for i in range(OPERATIONS):
+        key = f'key-{rand.randrange(KEYS)}'
+        if i % 10 == 0:
+            cache.set(key, {'value': i, 'payload': 'x' * 200})
+        else:
+            cache.get(key)
+
+
+def main():
+    setup()
+    from django.core.cache import caches
+
+    report(f'DatabaseCache ({OPERATIONS} ops)', timeit(lambda: workload(caches['shared']), repeat=3))
+    two_tier = caches['default']
+    report(f'TwoTierCache ({OPERATIONS} ops)', timeit(lambda: workload(two_tier), repeat=3))
+    stats = two_tier.hit_ratios()
+    print(
+        f"two-tier hit ratio {stats['hit_ratio']:.1%} "
+        f"(local {stats['local_ratio']:.1%}, shared {stats['shared_ratio']:.1%})"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Compare the old ``categories__contains`` scan with the indexed category
+relation over 100k Content rows.
+
+    python -m benchmarks.categories
+"""
+from benchmarks import setup, timeit, report
+
+ROWS = 100_000
+
+
+def main():
+    setup()
+    from django.db import connection
+    from contents.models import Content, sync_categories
+
+    labels = ['news', 'slider', 'sliders-old', 'event', 'news, slider']
+    Content.objects.bulk_create(
+        [
+            Content(
+                uid=f'uid-{i}', slug=f'article-{i}', title=f'Article {i}',
+                status=1, categories=labels[i % 100] if i % 100 < len(labels) else 'news'
+            )
+            for i in range(ROWS)
+        ],
+        batch_size=5000
+    )
+    sync_categories(Content.objects.get_queryset().only('pk', 'categories'))
+
+    scan = Content.objects.get_queryset().filter(categories__contains='slider')
+    indexed = Content.objects.get_queryset().with_category('slider')
+
+    print(f'{ROWS} rows, contains matches {scan.count()}, indexed matches {indexed.count()}')
+    report('categories__contains (LIKE scan)', timeit(lambda: list(scan.values_list('pk', flat=True))))
+    report('tags__name (indexed)', timeit(lambda: list(indexed.values_list('pk', flat=True))))
+
+    with connection.cursor() as cursor:
+        sql, params = indexed.values_list('pk').query.sql_with_params()
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        for row in cursor.fetchall():
+            print(' ', row[-1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Total of a 200k line CAD/IDR ledger in IDR, with two years of daily rates:
+a rate query per line, the in-memory RateTable over fetched lines, and
+converted_amount() summed in the database.
+
+    python -m benchmarks.currencies
+"""
+import datetime
+import random
+from decimal import Decimal
+from benchmarks import report, setup, timeit
+
+LINES = 200_000
+DAYS = 730
+
+
+def main():
+    setup()
+    from django.db import connection, models
+    from django.db.models import Sum
+    from currencies.models import CAD, IDR, ExchangeRate, converted_amount, get_rate_table
+
+    class LedgerLine(models.Model):
+        amount = models.DecimalField(max_digits=18, decimal_places=2)
+        currency = models.SmallIntegerField()
+        date = models.DateField()
+
+        class Meta:
+            app_label = 'currencies'
+
+    with connection.schema_editor() as editor:
+        editor.create_model(LedgerLine)
+
+    rand = random.Random(0)
+    start = datetime.date(2023, 1, 1)
+    ExchangeRate.objects.upsert([
+        (CAD, start + datetime.timedelta(days=day), Decimal(11000 + rand.randrange(1000)))
+        for day in range(DAYS)
+    ])
+    LedgerLine.objects.bulk_create([
+        LedgerLine(
+            amount=Decimal(rand.randrange(100, 10_000_000)) / 100,
+            currency=rand.choice((CAD, IDR)),
+            date=start + datetime.timedelta(days=rand.randrange(DAYS)),
+        )
+        for _ in range(LINES)
+    ], batch_size=5000)
+
+    def per_line_query():
+        total = Decimal(0)
+        for amount, currency, date in LedgerLine.objects.values_list('amount', 'currency', 'date')[:5000]:
+            rate = Decimal(1) if currency == IDR else ExchangeRate.objects.effective_on(currency, date).values_list('rate', flat=True)[0]
+            total += amount * rate
+        return total
+
+    def rate_table():
+        amounts, currencies, dates = zip(*LedgerLine.objects.values_list('amount', 'currency', 'date'))
+        return sum(get_rate_table().convert_many(amounts, currencies, dates, IDR))
+
+    def database():
+        return LedgerLine.objects.aggregate(total=Sum(converted_amount('amount', 'currency', 'date', IDR)))['total']
+
+    print(f'{LINES} ledger lines, {DAYS} daily rates')
+    report('rate query per line (extrapolated from 5k)', timeit(per_line_query, repeat=1) * LINES / 5000)
+    report('RateTable.convert_many', timeit(rate_table, repeat=3))
+    report('Sum(converted_amount) in SQL', timeit(database, repeat=3))
+    print(f'difference between the two totals: {abs(rate_table() - database()):.6f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+One DatatableView draw near the end of a 200k row table: OFFSET pagination
+with a COUNT(*) per draw against keyset pagination with cached counts.
+
+    python -m benchmarks.datatable
+"""
+import json
+from benchmarks import report, setup, timeit
+
+ROWS = 200_000
+LENGTH = 50
+
+
+def main():
+    setup()
+    from django.test import RequestFactory
+    from contents.models import Category
+    from fincapes.helpers import DatatableView
+
+    Category.objects.bulk_create(
+        [Category(name=f'category-{i:07d}') for i in range(ROWS)], batch_size=5000
+    )
+
+    class CategoryTable(DatatableView):
+        model = Category
+        column_defs = [
+            {'name': 'pk', 'visible': False},
+            {'name': 'name', 'orderable': True, 'searchable': True},
+        ]
+
+    def draw(view, start, cursor=''):
+        request = RequestFactory().get('/', {
+            'draw': 1, 'start': start, 'length': LENGTH, 'cursor': cursor,
+            'columns[0][name]': 'pk', 'columns[1][name]': 'name', 'columns[1][orderable]': 'true',
+            'order[0][column]': 1, 'order[0][dir]': 'asc',
+        }, HTTP_ACCEPT='application/json')
+        return json.loads(view(request).content)
+
+    start = ROWS - 2 * LENGTH
+    offset_view = CategoryTable.as_view()
+    keyset_view = CategoryTable.as_view(keyset_pagination=True)
+    cursor = draw(keyset_view, start - LENGTH)['cursor']
+
+    print(f'{ROWS} rows, page of {LENGTH} at row {start}')
+    report('OFFSET + COUNT(*) per draw', timeit(lambda: draw(offset_view, start)))
+    report('keyset seek + cached counts', timeit(lambda: draw(keyset_view, start, cursor)))
+
+
+if __name__ == '__main__':
+    main()
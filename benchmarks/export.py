@@ -0,0 +1,66 @@
+"""
+Streaming DatatableView export of 100k and 1M rows: time and peak RSS growth
+of a CSV and an XLSX download, each in a fresh process.
+
+    python -m benchmarks.export
+"""
+import json
+import subprocess
+import sys
+import time
+from benchmarks import peak_rss_growth, reset_peak_rss, setup
+
+ROWS = 1_000_000
+
+
+def measure(directory, fmt, search):
+    setup(directory=directory, migrate=False)
+    from django.test import RequestFactory
+    from contents.models import Category
+    from fincapes.helpers import DatatableView
+
+    class CategoryTable(DatatableView):
+        model = Category
+        column_defs = [
+            {'name': 'pk', 'title': 'ID'},
+            {'name': 'name', 'title': 'Name', 'orderable': True, 'searchable': True},
+        ]
+
+    request = RequestFactory().get('/', {
+        'action': 'export', 'format': fmt,
+        'columns[0][name]': 'pk', 'columns[1][name]': 'name',
+        'columns[1][searchable]': 'true', 'columns[1][search][value]': search,
+        'order[0][column]': 1, 'order[0][dir]': 'asc',
+    })
+    before = reset_peak_rss()
+    start = time.perf_counter()
+    response = CategoryTable.as_view()(request)
+    size = sum(len(chunk) for chunk in response.streaming_content)
+    elapsed = time.perf_counter() - start
+    print(json.dumps([elapsed, peak_rss_growth(before), size]))
+
+
+def main():
+    directory = setup()
+    from contents.models import Category
+    for offset in range(0, ROWS, 100_000):
+        Category.objects.bulk_create(
+            [Category(name=f'category-{i:07d}') for i in range(offset, offset + 100_000)], batch_size=5000
+        )
+
+    for fmt in ('csv', 'xlsx'):
+        for rows, search in ((100_000, 'category-00'), (ROWS, '')):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.export', directory, fmt, search],
+                check=True, capture_output=True, text=True
+            ).stdout
+            elapsed, peak, size = json.loads(output.splitlines()[-1])
+            label = f'{fmt} {rows} rows'
+            print(f'{label:<20} {elapsed:>8.1f} s {peak:>8.1f} MiB peak RSS growth {size / 2 ** 20:>8.1f} MiB file')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4:
+        measure(*sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,74 @@
+"""
+Calls per second of the currency and date helpers as they were (pattern
+chosen and a pendulum object built per call) against the cached per-locale
+formatters, and one render of a table-sized template through the filters.
+
+    python -m benchmarks.formatters
+"""
+import datetime
+from benchmarks import report, setup, timeit
+
+CALLS = 20_000
+
+
+def old_currency(amount, lang='id'):
+    cur = round(int(amount))
+    separator = ',' if lang == 'id' else '.'
+    separator_ = '.' if lang == 'id' else ','
+    dec = ',-' if lang == 'id' else '.-'
+    return '{:,}'.format(cur).replace(separator, separator_) + dec
+
+
+def old_locale_date(tgl, bhs=None):
+    import pendulum
+    from django.utils.translation import get_language
+    bhs = get_language() if bhs is None else bhs
+    pattern = 'DD/MM/YYYY' if bhs == 'id' else 'MM/DD/YYYY'
+    return pendulum.date(tgl.year, tgl.month, tgl.day).format(pattern)
+
+
+def old_full_date(date_model, day_name_include=False):
+    import pendulum
+    from django.utils.translation import get_language
+    tgl = pendulum.date(date_model.year, date_model.month, date_model.day)
+    pattern = 'dddd DD MMMM YYYY' if day_name_include else 'DD MMMM YYYY'
+    return tgl.format(pattern, locale=get_language())
+
+
+def calls_per_second(func, value):
+    def run():
+        for _ in range(CALLS):
+            func(value)
+    return CALLS / timeit(run)
+
+
+def main():
+    setup(migrate=False)
+    from django.template import Context, Template
+    from django.utils import translation
+    from fincapes.helpers import get_locale_date, get_locale_full_date
+    from fincapes.utils import currency
+
+    translation.activate('id')
+    day = datetime.date(2024, 8, 17)
+    print(f'{CALLS} calls per measurement, language id')
+    for label, before, after, value in (
+        ('currency()', old_currency, currency, 1234567),
+        ('get_locale_date()', old_locale_date, get_locale_date, day),
+        ('get_locale_full_date()', old_full_date, get_locale_full_date, day),
+    ):
+        old, new = calls_per_second(before, value), calls_per_second(after, value)
+        print(f'{label:<25} {old:>12,.0f}/s -> {new:>12,.0f}/s  ({new / old:.1f}x)')
+
+    rows = [{'amount': 1000 * i, 'date': day} for i in range(1000)]
+    template = Template(
+        '{% load fincapes_tags %}{% for row in rows %}'
+        '<tr><td>{{ row.amount|currency }}</td><td>{{ row.date|locale_date }}</td>'
+        '<td>{{ row.date|full_date }}</td></tr>{% endfor %}'
+    )
+    context = Context({'rows': rows})
+    report('1000-row table through the filters', timeit(lambda: template.render(context)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Bytes sent for a homepage-sized image: the original upload, the current
+500px 'medium' thumbnail in the source format, and the WebP/AVIF variants.
+
+    python -m benchmarks.images
+"""
+import random
+from io import BytesIO
+from benchmarks import setup
+
+SAMPLES = 5
+SOURCE_SIZE = (3000, 2000)
+
+
+def sample_photo(seed):
+    # smooth gradients plus grain, closer to a photo than flat colour or noise
+    from PIL import Image, ImageFilter
+    rand = random.Random(seed)
+    small = Image.new('RGB', (60, 40))
+    small.putdata([
+        (rand.randrange(256), rand.randrange(256), rand.randrange(256)) for _ in range(60 * 40)
+    ])
+    image = small.resize(SOURCE_SIZE, Image.BICUBIC).filter(ImageFilter.GaussianBlur(8))
+    grain = Image.effect_noise(SOURCE_SIZE, 12).convert('RGB')
+    return Image.blend(image, grain, 0.08)
+
+
+def encoded_size(image, fmt, **options):
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.tell()
+
+
+def main():
+    setup(migrate=False)
+    from PIL import Image
+    from fincapes.images import IMAGE_VARIANT_FORMATS, render_variant, supported_variant_formats
+
+    totals = {}
+    for seed in range(SAMPLES):
+        buffer = BytesIO()
+        sample_photo(seed).save(buffer, 'JPEG', quality=92)
+        totals['original JPEG 3000px'] = totals.get('original JPEG 3000px', 0) + buffer.tell()
+
+        buffer.seek(0)
+        medium = Image.open(buffer)
+        medium.thumbnail((500, 500 * medium.height // medium.width))
+        totals['medium JPEG 500px'] = totals.get('medium JPEG 500px', 0) + encoded_size(medium, 'JPEG', quality=85)
+
+        for fmt in supported_variant_formats():
+            for width in (640, 960):
+                buffer.seek(0)
+                image, pil_format, options = render_variant(buffer, width, fmt)
+                label = f'{fmt} {width}px'
+                totals[label] = totals.get(label, 0) + encoded_size(image, pil_format, **options)
+
+    print(f'{SAMPLES} sample photos, average bytes per image')
+    for label, total in totals.items():
+        print(f'{label:<25} {total / SAMPLES / 1024:>10.1f} KiB')
+    print(f"formats without encoder support here: "
+          f"{sorted(set(IMAGE_VARIANT_FORMATS) - set(supported_variant_formats())) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Time and peak RSS for a camera-sized JPEG: a thumbnail pass over the stored
+original (what every pass did), the one-off ingest stage, and a thumbnail
+pass over the ingested file.
+
+Every measurement runs in a fresh process, peak RSS is read from /proc (Linux).
+
+    python -m benchmarks.ingest
+"""
+import json
+import statistics
+import subprocess
+import sys
+import time
+from io import BytesIO
+from benchmarks import peak_rss_growth, reset_peak_rss, setup
+from benchmarks.images import sample_photo
+
+SOURCE_SIZE = (6000, 4000)
+THUMBNAIL_SIZE = (500, 500)
+
+
+def thumbnail_pass(data):
+    from PIL import Image
+    image = Image.open(BytesIO(data))
+    image.load()
+    image.thumbnail(THUMBNAIL_SIZE)
+
+
+def ingest(data):
+    from fincapes.images import ingest_image
+    ingest_image(BytesIO(data))
+
+
+def measure(name, path):
+    setup(migrate=False)
+    with open(path, 'rb') as f:
+        data = f.read()
+    before = reset_peak_rss()
+    start = time.perf_counter()
+    {'thumbnail': thumbnail_pass, 'ingest': ingest}[name](data)
+    elapsed = time.perf_counter() - start
+    print(json.dumps([elapsed, peak_rss_growth(before)]))
+
+
+def run_isolated(name, path):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.ingest', name, path],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    directory = setup(migrate=False)
+    from benchmarks import images
+    images.SOURCE_SIZE = SOURCE_SIZE
+    from fincapes.images import ingest_image
+    original = f'{directory}/camera.jpg'
+    sample_photo(0).save(original, 'JPEG', quality=95)
+    ingested = f'{directory}/ingested.jpg'
+    with open(original, 'rb') as source, open(ingested, 'wb') as f:
+        f.write(ingest_image(source)[0].read())
+
+    print(f'{SOURCE_SIZE[0]}x{SOURCE_SIZE[1]} JPEG upload, ingest cap 2560px')
+    for label, name, path in (
+        ('thumbnail pass, stored original', 'thumbnail', original),
+        ('ingest on upload (once)', 'ingest', original),
+        ('thumbnail pass, ingested file', 'thumbnail', ingested),
+    ):
+        runs = [run_isolated(name, path) for _ in range(3)]
+        elapsed = statistics.median(run[0] for run in runs)
+        peak = max(run[1] for run in runs)
+        print(f'{label:<35} {elapsed * 1000:>9.1f} ms {peak:>9.1f} MiB peak RSS growth')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        measure(*sys.argv[1:])
+    else:
+        main()
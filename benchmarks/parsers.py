@@ -0,0 +1,53 @@
+"""
+Parsing a 50k row import sheet (amount, date, percentage columns): the
+per-value helpers against fincapes.parsers.parse_table.
+
+    python -m benchmarks.parsers
+"""
+import datetime
+import random
+from benchmarks import report, setup, timeit
+
+ROWS = 50_000
+
+
+def sample_rows(seed=0):
+    rand = random.Random(seed)
+    start = datetime.date(2024, 1, 1)
+    rows = []
+    for _ in range(ROWS):
+        amount = '{:,}'.format(rand.randrange(10_000, 50_000_000)).replace(',', '.') + ',-'
+        date = start + datetime.timedelta(days=rand.randrange(366))
+        rows.append({
+            'amount': amount,
+            'date': date.strftime('%d/%m/%Y'),
+            'rate': '{},{}'.format(rand.randrange(20), rand.randrange(10)),
+        })
+    return rows
+
+
+def main():
+    setup(migrate=False)
+    from fincapes.helpers import PercentageField, check_date_valid
+    from fincapes.parsers import numpy, parse_table
+    from fincapes.utils import string_separator_to_number
+
+    rows = sample_rows()
+    columns = {'amount': 'amount', 'date': 'date', 'rate': 'percentage'}
+    field = PercentageField(localize=True)
+
+    def per_value():
+        for row in rows:
+            string_separator_to_number(row['amount'])
+            check_date_valid(row['date'])
+            field.to_python(row['rate'])
+
+    print(f'{ROWS} rows x 3 columns')
+    report('per-value helpers', timeit(per_value, repeat=3))
+    report('parse_table', timeit(lambda: parse_table(rows, columns), repeat=3))
+    if numpy is not None:
+        report('parse_table, NumPy arrays', timeit(lambda: parse_table(rows, columns, arrays=True), repeat=3))
+
+
+if __name__ == '__main__':
+    main()
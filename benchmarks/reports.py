@@ -0,0 +1,57 @@
+"""
+Twelve months of 'users joined' for a dashboard: one COUNT per month, one
+TruncMonth GROUP BY, the report's single query on SQLite and the report
+with its closed months cached.
+
+    python -m benchmarks.reports
+"""
+import datetime
+import random
+from benchmarks import report, setup, timeit
+
+USERS = 100_000
+
+
+def main():
+    setup()
+    from django.core.cache import cache
+    from django.utils import timezone
+    from accounts.models import User
+    from fincapes.reports import get_report_timezone, grouped_by_month, month_ranges, monthly_report
+    from fincapes.utils import assign_unique_ids
+
+    # spread the join dates over the last 400 days
+    User._meta.get_field('timestamp').auto_now_add = False
+    now = timezone.now()
+    rand = random.Random(0)
+    User.objects.bulk_create(assign_unique_ids([
+        User(email=f'user{i}@fincapes.com', first_name='User',
+             timestamp=now - datetime.timedelta(seconds=rand.randrange(400 * 24 * 3600)))
+        for i in range(USERS)
+    ]), batch_size=5000)
+    tzinfo = get_report_timezone()
+
+    def per_month():
+        return [
+            User.objects.filter(timestamp__gte=start, timestamp__lt=end).count()
+            for start, end in month_ranges(11, True, tzinfo)
+        ]
+
+    def truncated():
+        return grouped_by_month(User.objects.all(), 'timestamp', month_ranges(11, True, tzinfo), tzinfo, truncate=True)
+
+    def grouped():
+        cache.clear()
+        return monthly_report('users_joined', months_ago=11, tzinfo=tzinfo)
+
+    assert per_month() == [row['value'] for row in grouped()]
+    print(f'{USERS} users, 12 months')
+    report('one COUNT per month', timeit(per_month))
+    report('TruncMonth GROUP BY', timeit(truncated))
+    report('monthly_report, cold cache', timeit(grouped))
+    monthly_report('users_joined', months_ago=11, tzinfo=tzinfo)
+    report('monthly_report, closed months cached', timeit(lambda: monthly_report('users_joined', months_ago=11, tzinfo=tzinfo)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Throughput of several worker processes reading and writing one SQLite file,
+with Django's stock sqlite3 backend and with fincapes.db.sqlite3.
+
+    python -m benchmarks.sqlite
+"""
+import multiprocessing
+import time
+from benchmarks import setup
+
+WORKERS = 8
+REQUESTS = 300
+
+PROFILES = {
+    'django.db.backends.sqlite3': {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 0},
+    'fincapes.db.sqlite3': {'ENGINE': 'fincapes.db.sqlite3', 'CONN_MAX_AGE': 600},
+}
+
+
+def worker(args):
+    directory, database, worker_id = args
+    setup(directory=directory, database=database, migrate=False)
+    from django.db import OperationalError, close_old_connections, transaction
+    from contents.models import Category
+
+    errors = 0
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        # one "request": a few reads and, every fourth time, a write
+        try:
+            list(Category.objects.order_by('-pk')[:20])
+            Category.objects.filter(name__startswith='w').count()
+            if i % 4 == 0:
+                with transaction.atomic():
+                    Category.objects.create(name=f'w{worker_id}-{i}')
+        except OperationalError:
+            errors += 1
+        close_old_connections()
+    return errors, time.perf_counter() - start
+
+
+def run(database):
+    directory = setup(database=database)
+    from django.db import connections
+    connections.close_all()
+    with multiprocessing.get_context('spawn').Pool(WORKERS) as pool:
+        results = pool.map(worker, [(directory, database, n) for n in range(WORKERS)])
+    # workers start together, the slowest one bounds the wall time
+    return max(elapsed for _, elapsed in results), sum(errors for errors, _ in results)
+
+
+def main():
+    for label, database in PROFILES.items():
+        elapsed, errors = run(database)
+        total = WORKERS * REQUESTS
+        print(f'{label:<30} {total / elapsed:>8.0f} req/s  {errors} "database is locked" errors')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Local-time helpers and per-day counts in the user's timezone: pytz.timezone()
+per call against the cached zones, and converting every row in Python or
+with TruncDate(tzinfo=...) against count_by_local_date().
+
+    python -m benchmarks.timezones
+"""
+import datetime
+import random
+from collections import Counter
+from benchmarks import report, setup, timeit
+
+ROWS = 100_000
+CALLS = 20_000
+
+
+def main():
+    setup()
+    import pytz
+    from django.utils import timezone
+    from contents.models import Content
+    from django.db.models import Count
+    from django.db.models.functions import TruncDate
+    from fincapes.timezones import get_zone
+    from fincapes.utils import get_date_time_local
+
+    def old_date_time_local(date_model, tzinfo='Asia/Jakarta'):
+        return date_model.astimezone(pytz.timezone(tzinfo))
+
+    Content._meta.get_field('timestamp').auto_now_add = False
+    now = timezone.now()
+    rand = random.Random(0)
+    Content.objects.bulk_create([
+        Content(title=f'content {i}', slug=f'content-{i}',
+                timestamp=now - datetime.timedelta(seconds=rand.randrange(30 * 24 * 3600)))
+        for i in range(ROWS)
+    ], batch_size=5000)
+
+    def calls(func):
+        return lambda: [func(now, 'Asia/Jakarta') for _ in range(CALLS)]
+
+    report(f'{CALLS} x pytz.timezone() + astimezone', timeit(calls(old_date_time_local)))
+    report(f'{CALLS} x get_date_time_local(), cached', timeit(calls(get_date_time_local)))
+
+    def in_python(zone):
+        timestamps = Content.objects.order_by().values_list('timestamp', flat=True)
+        return Counter(old_date_time_local(value, zone).date() for value in timestamps)
+
+    def truncated(zone):
+        rows = Content.objects.order_by().annotate(local_date=TruncDate('timestamp', tzinfo=get_zone(zone))).values(
+            'local_date').annotate(count=Count('pk'))
+        return {row['local_date']: row['count'] for row in rows}
+
+    def in_database(zone):
+        return Content.objects.count_by_local_date(tzinfo=zone)
+
+    print(f'{ROWS} rows over 30 days, counts per local day')
+    for zone in ('Asia/Jakarta', 'America/Toronto'):
+        assert in_python(zone) == truncated(zone) == in_database(zone)
+        report(f'{zone}: fetch rows, convert in Python', timeit(lambda: in_python(zone)))
+        report(f'{zone}: TruncDate GROUP BY', timeit(lambda: truncated(zone)))
+        report(f'{zone}: count_by_local_date()', timeit(lambda: in_database(zone)))
+
+
+if __name__ == '__main__':
+    main()
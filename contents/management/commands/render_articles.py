@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from contents.models import Content, RENDERED_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Render the stored HTML, excerpt and word count of every Content article'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        fields = [name for columns in RENDERED_FIELDS.values() for name in columns]
+        qs = Content.objects.get_queryset().only('pk', *RENDERED_FIELDS).order_by('pk')
+        chunk = []
+        total = 0
+        for content in qs.iterator(chunk_size=options['chunk_size']):
+            content.render_articles()
+            chunk.append(content)
+            if len(chunk) == options['chunk_size']:
+                Content.objects.bulk_update(chunk, fields)
+                total += len(chunk)
+                chunk = []
+        Content.objects.bulk_update(chunk, fields)
+        total += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Rendered {total} contents'))
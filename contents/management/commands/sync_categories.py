@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from contents.models import Content, sync_categories
+
+
+class Command(BaseCommand):
+    help = 'Copy the free-text Content.categories into the indexed category relation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        qs = Content.objects.get_queryset().only('pk', 'categories').order_by('pk')
+        total = 0
+        chunk = []
+        for content in qs.iterator(chunk_size=chunk_size):
+            chunk.append(content)
+            if len(chunk) == chunk_size:
+                sync_categories(chunk)
+                total += len(chunk)
+                chunk = []
+        sync_categories(chunk)
+        total += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Synced categories for {total} contents'))
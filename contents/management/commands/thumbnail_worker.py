@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+from fincapes.images import process_queue, thumbnail_pool
+
+
+class Command(BaseCommand):
+    help = 'Generate queued thumbnails with a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between queue polls')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        # The pool forks from here, do not hand it our database connection.
+        connections.close_all()
+        with thumbnail_pool(options['processes']) as executor:
+            while True:
+                done = process_queue(executor)
+                if done:
+                    self.stdout.write(f'Generated thumbnails for {done} images')
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
@@ -1,38 +1,128 @@
+import re
 from django.db import models
 from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models import Q
-from django.db.models.signals import pre_save
-from django.utils.translation import gettext as _
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.db.models.signals import pre_save, post_save
+from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.utils.text import slugify
+from django.utils.translation import gettext as _, get_language
 from django_quill.fields import QuillField
-from thumbnails.fields import ImageField
-from fincapes.helpers import get_date_human
+from fincapes.images import ImageField, ThumbnailQuerySetMixin
+from fincapes.timezones import LocalDateQuerySetMixin
+from fincapes.helpers import get_date_human, humanize_dates, render_quill
 from fincapes.utils import (
     unique_id_generator, unique_slug_generator,
-    saved_directory_path
+    assign_unique_ids, assign_unique_slugs, saved_directory_path
 )
 
 User = get_user_model()
 
+DRAFT = 0
+PUBLISH = 1
+
 STATUS_CHOICES = (
-    (0, 'Draft'),
-    (1, 'Publish')
+    (DRAFT, 'Draft'),
+    (PUBLISH, 'Publish')
+)
+
+# Article bodies, only needed when a single article is rendered
+HEAVY_FIELDS = ('article', 'article_id', 'article_html', 'article_id_html')
+
+# English column -> Bahasa Indonesia column
+LOCALIZED_FIELDS = {
+    'title': 'title_id',
+    'brief_description': 'brief_description_id',
+    'photo_caption': 'photo_caption_id',
+    'article_excerpt': 'article_id_excerpt',
+    'article_html': 'article_id_html',
+}
+LOCALIZED_ARTICLE_FIELDS = ('article_html',)
+LOCALIZED_BASE_FIELDS = (
+    'uid', 'slug', 'slug_id', 'photo', 'status', 'categories',
+    'article_words', 'article_id_words', 'timestamp', 'updated'
 )
 
+# Quill field -> (html, excerpt, word count) columns rendered on save
+RENDERED_FIELDS = {
+    'article': ('article_html', 'article_excerpt', 'article_words'),
+    'article_id': ('article_id_html', 'article_id_excerpt', 'article_id_words'),
+}
+
 
 def save_photo_path(instance, filename):
     return saved_directory_path(instance, filename, 'contents')
 
 
-class ContentQuerySet(models.query.QuerySet):
+def parse_categories(value):
+    names = (slugify(name) for name in re.split(r'[,;]', value or ''))
+    return sorted({name for name in names if name})
+
+
+class CategoryManager(models.Manager):
+    def get_or_create_many(self, names):
+        names = set(names)
+        categories = list(self.get_queryset().filter(name__in=names))
+        missing = names - {category.name for category in categories}
+        if missing:
+            self.bulk_create(
+                [self.model(name=name) for name in missing], ignore_conflicts=True
+            )
+            categories = list(self.get_queryset().filter(name__in=names))
+        return categories
+
+
+class Category(models.Model):
+    name = models.SlugField(max_length=50, unique=True)
+
+    objects = CategoryManager()
+
+    class Meta:
+        verbose_name_plural = 'categories'
+
+    def __str__(self):
+        return self.name
+
+
+class ContentQuerySet(ThumbnailQuerySetMixin, LocalDateQuerySetMixin, models.query.QuerySet):
     def recent(self):
         return self.order_by('-updated')
     
+    def published(self):
+        return self.filter(status=PUBLISH)
+    
+    def listing(self):
+        return self.defer(*HEAVY_FIELDS)
+    
+    def for_language(self, language=None):
+        language = language or get_language()
+        field = 'title_id' if language == 'id' else 'title'
+        return self.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+    
+    def localized(self, language=None, with_article=False):
+        # Load one value per bilingual pair, the active language first and the
+        # other one as fallback, instead of both columns.
+        language = language or get_language()
+        annotations = {}
+        for field, field_id in LOCALIZED_FIELDS.items():
+            if field in LOCALIZED_ARTICLE_FIELDS and not with_article:
+                continue
+            first, second = (field_id, field) if language == 'id' else (field, field_id)
+            annotations[f'localized_{field}'] = Coalesce(
+                NullIf(first, Value('')), NullIf(second, Value('')),
+                output_field=models.TextField()
+            )
+        return self.only(*LOCALIZED_BASE_FIELDS).annotate(**annotations)
+    
+    def with_category(self, name):
+        return self.filter(tags__name=name)
+    
     def sliders(self):
-        return self.filter(categories__contains='slider').order_by('-updated')
+        return self.with_category('slider').order_by('-updated')
     
     
 class ContentManager(models.Manager):
@@ -40,19 +130,54 @@ class ContentManager(models.Manager):
         return ContentQuerySet(self.model, using=self._db)
     
     def get_by_pk(self, pk):
-        qs = self.get_queryset().recent().filter(pk=pk)
-        if qs.exists():
-            return qs.first()
-        return None
+        try:
+            return self.get_queryset().get(pk=pk)
+        except self.model.DoesNotExist:
+            return None
     
     def all(self):
         return self.get_queryset().recent().all()
+    
+    def published(self):
+        return self.get_queryset().published().recent()
+    
+    def for_language(self, language=None):
+        return self.get_queryset().for_language(language)
+    
+    def localized(self, language=None, with_article=False):
+        return self.get_queryset().localized(language, with_article=with_article)
+    
+    def with_category(self, name):
+        return self.get_queryset().with_category(name)
+    
+    def on_local_date(self, date, field=None, tzinfo=None):
+        return self.get_queryset().on_local_date(date, field, tzinfo)
+    
+    def count_by_local_date(self, field=None, tzinfo=None):
+        return self.get_queryset().count_by_local_date(field, tzinfo)
+    
+    def with_thumbnails(self, *sizes):
+        return self.get_queryset().with_thumbnails(*sizes)
         
+    def humanized(self, objects, field='timestamp'):
+        objects = list(objects)
+        humanize_dates(objects, field=field, to_attr='human_update')
+        return objects
+    
     def get_sliders(self):
-        qs = self.get_queryset().sliders()
-        if qs.exists():
-            return qs
-        return None
+        return self.get_queryset().published().sliders().listing().with_thumbnails('small', 'medium')
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = assign_unique_ids(list(objs))
+        assign_unique_slugs(objs, field='slug', source='title')
+        assign_unique_slugs([obj for obj in objs if obj.title_id], field='slug_id', source='title_id')
+        for obj in objs:
+            obj.render_articles()
+            set_published(obj)
+        objs = super().bulk_create(objs, *args, **kwargs)
+        # no post_save here; rows whose pk did not come back are skipped
+        sync_categories([obj for obj in objs if obj.categories])
+        return objs
     
     
 class Content(models.Model):
@@ -70,35 +195,134 @@ class Content(models.Model):
     brief_description_id = models.CharField(max_length=500, blank=True, null=True)
     article = QuillField(null=True)
     article_id = QuillField(null=True)
+    article_html = models.TextField(blank=True, default='', editable=False)
+    article_id_html = models.TextField(blank=True, default='', editable=False)
+    article_excerpt = models.CharField(max_length=300, blank=True, default='', editable=False)
+    article_id_excerpt = models.CharField(max_length=300, blank=True, default='', editable=False)
+    article_words = models.PositiveIntegerField(default=0, editable=False)
+    article_id_words = models.PositiveIntegerField(default=0, editable=False)
     status = models.SmallIntegerField(choices=STATUS_CHOICES, default=0)
     categories = models.CharField(max_length=255, null=True, blank=True)
+    tags = models.ManyToManyField(Category, related_name='contents', blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # first time the content was published, kept when it is unpublished
+    published = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
     added_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='added_article', null=True)
     modified_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='modified_article', null=True)
 
     objects = ContentManager()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-updated']),
+        ]
+    
     def __str__(self):
         return self.title if self.title is not None else self.title_id
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_categories = instance.__dict__.get('categories')
+        return instance
+    
     def get_absolute_url(self):
         return reverse("article:detail", kwargs={"pk": self.pk, 'slug': self.slug})
     
+    def render_articles(self):
+        deferred = self.get_deferred_fields()
+        for field, (html_field, excerpt_field, words_field) in RENDERED_FIELDS.items():
+            if field in deferred:
+                continue
+            rendered = render_quill(getattr(self, field))
+            setattr(self, html_field, rendered['html'])
+            setattr(self, excerpt_field, rendered['excerpt'])
+            setattr(self, words_field, rendered['words'])
+    
+    def get_localized(self, field):
+        annotated = f'localized_{field}'
+        if annotated in self.__dict__:
+            return self.__dict__[annotated]
+        field_id = LOCALIZED_FIELDS[field]
+        first, second = (field_id, field) if get_language() == 'id' else (field, field_id)
+        return getattr(self, first) or getattr(self, second)
+    
+    @property
+    def get_title(self):
+        return self.get_localized('title')
+    
+    @property
+    def get_brief_description(self):
+        return self.get_localized('brief_description')
+    
+    @property
+    def get_photo_caption(self):
+        return self.get_localized('photo_caption')
+    
+    @property
+    def get_excerpt(self):
+        return self.get_localized('article_excerpt')
+    
+    @property
+    def get_article(self):
+        return mark_safe(self.get_localized('article_html') or '')
+    
     @property
     def get_update(self):
-        tgl = str(self.timestamp)
-        return get_date_human(tgl)
+        if 'human_update' in self.__dict__:
+            return self.human_update
+        return get_date_human(self.timestamp)
     
 
+def set_published(instance):
+    if instance.status == PUBLISH and instance.published is None:
+        instance.published = timezone.now()
+
+
 def pre_save_content_create(instance, *args, **kwargs):
     if not instance.uid:
         instance.uid = unique_id_generator(instance)
         
-    if instance.title:
-        instance.slug = slugify(instance.title)
+    instance.slug = unique_slug_generator(instance, field='slug', source='title')
     if instance.title_id:
-        instance.slug_id = slugify(instance.title_id)
+        instance.slug_id = unique_slug_generator(instance, field='slug_id', source='title_id')
+    
+    instance.render_articles()
+    set_published(instance)
         
 
-pre_save.connect(pre_save_content_create, sender=Content)    
\ No newline at end of file
+pre_save.connect(pre_save_content_create, sender=Content)
+
+
+def sync_categories(contents):
+    # Mirror the free-text ``categories`` column into the indexed ``tags``
+    # relation, for any number of rows in a fixed number of queries.
+    contents = [content for content in contents if content.pk]
+    if not contents:
+        return
+    names = {content.pk: parse_categories(content.categories) for content in contents}
+    categories = Category.objects.get_or_create_many(
+        {name for content_names in names.values() for name in content_names}
+    )
+    category_ids = {category.name: category.pk for category in categories}
+
+    Through = Content.tags.through
+    Through.objects.filter(content__in=contents).delete()
+    Through.objects.bulk_create([
+        Through(content_id=pk, category_id=category_ids[name])
+        for pk, content_names in names.items() for name in content_names
+    ])
+    for content in contents:
+        content._loaded_categories = content.categories
+
+
+def post_save_content_categories(sender, instance, created, *args, **kwargs):
+    if created and not instance.categories:
+        return
+    if not created and instance.categories == getattr(instance, '_loaded_categories', None):
+        return
+    sync_categories([instance])
+
+
+post_save.connect(post_save_content_categories, sender=Content)    
\ No newline at end of file
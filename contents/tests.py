@@ -1,3 +1,325 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock
+from PIL import Image
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from fincapes.utils import get_date_time_local, last_time_today
+import json
+from fincapes.images import pending_jobs, process_queue, thumbnail_url
+from .models import Content, Category, PUBLISH, HEAVY_FIELDS
 
-# Create your tests here.
+
+class ContentSlugTest(TestCase):
+    def test_slug_collisions_get_next_suffix(self):
+        first = Content.objects.create(title='Hello World', title_id='Halo Dunia')
+        with self.assertNumQueries(3):
+            second = Content.objects.create(title='Hello World', title_id='Halo Dunia')
+        third = Content.objects.create(title='Hello World')
+        self.assertEqual(first.slug, 'hello-world')
+        self.assertEqual(second.slug, 'hello-world-2')
+        self.assertEqual(second.slug_id, 'halo-dunia-2')
+        self.assertEqual(third.slug, 'hello-world-3')
+
+    def test_resave_keeps_slug(self):
+        Content.objects.create(title='Hello World')
+        content = Content.objects.create(title='Hello World')
+        content.save()
+        self.assertEqual(content.slug, 'hello-world-2')
+
+    def test_bulk_create_assigns_slugs_in_memory(self):
+        Content.objects.create(title='Hello World')
+        contents = Content.objects.bulk_create(
+            [Content(title='Hello World', title_id='Halo Dunia') for _ in range(3)]
+        )
+        self.assertEqual(
+            [content.slug for content in contents],
+            ['hello-world-2', 'hello-world-3', 'hello-world-4']
+        )
+        self.assertEqual(
+            [content.slug_id for content in contents],
+            ['halo-dunia', 'halo-dunia-2', 'halo-dunia-3']
+        )
+
+
+class ContentManagerTest(TestCase):
+    def setUp(self):
+        self.slider = Content.objects.create(
+            title='Slider', title_id='Geser', status=PUBLISH, categories='slider'
+        )
+        Content.objects.create(title='Draft slider', categories='slider')
+        Content.objects.create(title='Article', status=PUBLISH, categories='sliders-old, news')
+
+    def test_get_by_pk_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Content.objects.get_by_pk(self.slider.pk), self.slider)
+        with self.assertNumQueries(1):
+            self.assertIsNone(Content.objects.get_by_pk(0))
+
+    def test_sliders_are_published_and_deferred(self):
+        with self.assertNumQueries(1):
+            sliders = list(Content.objects.get_sliders())
+        self.assertEqual(sliders, [self.slider])
+        self.assertEqual(sliders[0].get_deferred_fields(), set(HEAVY_FIELDS))
+
+    def test_for_language(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(Content.objects.published().for_language('id')), [self.slider])
+        self.assertEqual(Content.objects.published().for_language('en').count(), 2)
+
+
+class CategoryTest(TestCase):
+    def test_categories_are_synced_on_save(self):
+        content = Content.objects.create(title='Article', categories='Slider, News')
+        self.assertEqual(sorted(content.tags.values_list('name', flat=True)), ['news', 'slider'])
+        content.categories = 'news'
+        content.save()
+        self.assertEqual(list(content.tags.values_list('name', flat=True)), ['news'])
+
+    def test_categories_are_synced_on_bulk_create(self):
+        Content.objects.bulk_create([
+            Content(title='Slide', categories='slider', status=PUBLISH), Content(title='Plain')
+        ])
+        self.assertEqual([content.title for content in Content.objects.get_sliders()], ['Slide'])
+
+    def test_sync_command_migrates_existing_strings(self):
+        content = Content.objects.create(title='Article')
+        Content.objects.filter(pk=content.pk).update(categories='slider;sliders-old')
+        call_command('sync_categories', stdout=StringIO())
+        self.assertEqual(
+            sorted(Category.objects.values_list('name', flat=True)), ['slider', 'sliders-old']
+        )
+        self.assertEqual(list(Content.objects.with_category('slider')), [content])
+
+
+class ArticleRenderTest(TestCase):
+    def quill(self, html):
+        return json.dumps({'delta': '', 'html': html})
+
+    def test_article_rendered_on_save(self):
+        content = Content.objects.create(
+            title='Article',
+            article=self.quill('<p class="ql-align-center">Hello <b>big</b> world &amp; more</p>'
+                               '<script>alert(1)</script><a href="javascript:x" onclick="y">link</a>'),
+        )
+        self.assertEqual(
+            content.article_html,
+            '<p class="ql-align-center">Hello <b>big</b> world &amp; more</p><a>link</a>'
+        )
+        self.assertEqual(content.article_excerpt, 'Hello big world & more link')
+        self.assertEqual(content.article_words, 6)
+
+        embedded = Content.objects.create(title='Embedded', article=self.quill(
+            '<p><img src="data:image/png;base64,iVBORw0KGgo="></p>'
+            '<p><img src="data:image/svg+xml;base64,PHN2Zz4="><a href="data:image/png;base64,AA==">x</a></p>'
+        ))
+        self.assertEqual(
+            embedded.article_html,
+            '<p><img src="data:image/png;base64,iVBORw0KGgo="></p><p><img><a>x</a></p>'
+        )
+
+        listed = Content.objects.get_queryset().listing().get(pk=content.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(listed.article_words, 6)
+
+
+class LocalizedContentTest(TestCase):
+    def setUp(self):
+        self.content = Content.objects.create(
+            title='Hello', title_id='Halo', brief_description='Brief',
+            article=json.dumps({'delta': '', 'html': '<p>Body</p>'})
+        )
+
+    def test_localized_loads_active_language(self):
+        with self.assertNumQueries(1):
+            content = Content.objects.localized('id').get(pk=self.content.pk)
+            self.assertEqual(content.get_title, 'Halo')
+            self.assertEqual(content.get_brief_description, 'Brief')
+            self.assertEqual(content.get_excerpt, 'Body')
+        self.assertTrue({'title', 'title_id', 'article', 'article_id'} <= content.get_deferred_fields())
+
+    def test_localized_article_on_request(self):
+        with self.assertNumQueries(1):
+            content = Content.objects.localized('id', with_article=True).get(pk=self.content.pk)
+            self.assertEqual(content.get_article, '<p>Body</p>')
+
+
+class HumanizedDateTest(TestCase):
+    def test_humanized_batch_and_filter(self):
+        Content.objects.bulk_create([Content(title=f'Article {i}') for i in range(3)])
+        Content.objects.update(timestamp=timezone.now() - timedelta(hours=2, minutes=5))
+        contents = Content.objects.humanized(Content.objects.get_queryset().listing())
+        with self.assertNumQueries(0):
+            updates = [content.get_update for content in contents]
+        # the same wording as a single object's get_update
+        self.assertEqual(updates, ['2 hours ago'] * 3)
+        self.assertEqual(Content.objects.get(pk=contents[0].pk).get_update, '2 hours ago')
+
+        rendered = Template('{% load fincapes_tags %}{{ content.timestamp|human_date:"id" }}').render(
+            Context({'content': contents[0]})
+        )
+        self.assertIn('lalu', rendered)
+
+
+def sample_image(name='photo.jpg', size=(800, 600), fmt='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 80, 40)).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class TemporaryMediaMixin(object):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media, THUMBNAIL_QUEUE_DIR=f'{media}/queue')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class ThumbnailQueueTest(TemporaryMediaMixin, TestCase):
+    def test_thumbnails_are_queued_not_generated_inline(self):
+        content = Content.objects.create(title='Photo', photo=sample_image())
+        self.assertEqual(len(pending_jobs()), 1)
+        self.assertEqual(thumbnail_url(content.photo, 'small'), content.photo.url)
+
+        self.assertEqual(process_queue(), 1)
+        self.assertEqual(pending_jobs(), [])
+        content = Content.objects.get(pk=content.pk)
+        self.assertNotEqual(thumbnail_url(content.photo, 'small'), content.photo.url)
+        self.assertEqual(set(content.photo.thumbnails.all()), {'small', 'medium'})
+
+
+class ImageVariantTest(TemporaryMediaMixin, TestCase):
+    def test_variant_generated_once_and_cached(self):
+        content = Content.objects.create(title='Photo', photo=sample_image(size=(1600, 1200)))
+        url = f'/img/640/webp/{content.photo.name}'
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (640, 480))
+        self.assertTrue(default_storage.exists(f'variants/{content.photo.name[:-4]}_640w.webp'))
+
+        self.assertEqual(self.client.get(f'/img/641/webp/{content.photo.name}').status_code, 404)
+        self.assertEqual(self.client.get(f'/img/1600/webp/{content.photo.name}').status_code, 200)
+
+        small = Content.objects.create(title='Small', photo=sample_image(size=(700, 500)))
+        self.assertEqual(self.client.get(f'/img/960/webp/{small.photo.name}').status_code, 404)
+
+    def test_variants_deleted_with_source(self):
+        content = Content.objects.create(title='Photo', photo=sample_image(size=(1600, 1200)))
+        self.client.get(f'/img/640/webp/{content.photo.name}')
+        variant = f'variants/{content.photo.name[:-4]}_640w.webp'
+        self.assertTrue(default_storage.exists(variant))
+        # django_cleanup deletes the files once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            content.delete()
+        self.assertFalse(default_storage.exists(variant))
+        self.assertFalse(default_storage.exists(content.photo.name))
+        self.assertEqual(self.client.get('/img/640/webp/missing.jpg').status_code, 404)
+
+    def test_picture_tag(self):
+        content = Content.objects.create(title='Photo', photo=sample_image())
+        rendered = Template('{% load fincapes_tags %}{% picture content.photo sizes="50vw" alt="Photo" %}').render(
+            Context({'content': content})
+        )
+        self.assertIn('<source type="image/webp" srcset="/img/320/webp/', rendered)
+        # the 800px source: no 960w/1280w entries, the source width last
+        self.assertIn('640w, /img/800/webp/', rendered)
+        self.assertIn('800w" sizes="50vw">', rendered)
+        self.assertNotIn('960w', rendered)
+        self.assertIn(f'<img src="{content.photo.url}" alt="Photo"', rendered)
+
+
+class ContentAddressedUploadTest(TemporaryMediaMixin, TestCase):
+    def test_identical_uploads_share_one_file(self):
+        first = Content.objects.create(title='First', photo=sample_image())
+        second = Content.objects.create(title='Second', photo=sample_image('other.JPG'))
+        self.assertEqual(first.photo.name, second.photo.name)
+        self.assertRegex(first.photo.name, r'^contents/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.jpg$')
+        self.assertEqual(len(os.listdir(os.path.dirname(first.photo.path))), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(second.photo.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(second.photo.name))
+
+    def test_sources_registered_through_metadata_backend(self):
+        backend = Content._meta.get_field('photo').metadata_backend
+        with mock.patch.object(backend, 'add_source', wraps=backend.add_source) as add_source:
+            first = Content.objects.create(title='First', photo=sample_image())
+            Content.objects.create(title='Second', photo=sample_image('other.jpg'))
+        add_source.assert_called_once_with(first.photo.name)
+
+
+class ImageIngestTest(TemporaryMediaMixin, TestCase):
+    @override_settings(IMAGE_INGEST_MAX_SIZE=(1000, 1000))
+    def test_upload_is_capped_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x010f] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (3000, 2000), (200, 80, 40)).save(buffer, 'JPEG', exif=exif, quality=95)
+        upload = SimpleUploadedFile('IMG_0001.JPEG', buffer.getvalue(), content_type='image/jpeg')
+
+        content = Content.objects.create(title='Photo', photo=upload)
+        self.assertTrue(content.photo.name.endswith('.jpg'))
+        with Image.open(content.photo.path) as image:
+            self.assertEqual(image.size, (1000, 667))
+            self.assertEqual(dict(image.getexif()), {})
+        self.assertLess(content.photo.size, len(buffer.getvalue()))
+
+
+class ThumbnailPrefetchTest(TemporaryMediaMixin, TestCase):
+    def test_listing_renders_with_fixed_queries(self):
+        for i in range(3):
+            Content.objects.create(title=f'Photo {i}', photo=sample_image(), status=PUBLISH, categories='slider')
+        process_queue()
+        template = Template(
+            '{% load fincapes_tags %}{% for content in sliders %}'
+            '{{ content.photo|thumbnail:"small" }}{{ content.photo.thumbnails.medium.url }}{% endfor %}'
+        )
+        with self.assertNumQueries(2):
+            rendered = template.render(Context({'sliders': Content.objects.get_sliders()}))
+        self.assertEqual(rendered.count('_small'), 3)
+        self.assertEqual(rendered.count('_medium'), 3)
+
+
+class LocalDateTest(TestCase):
+    def setUp(self):
+        # 2024-03-01 20:00 UTC is already 2024-03-02 in Jakarta (UTC+7)
+        for hour in (10, 20):
+            content = Content.objects.create(title=f'At {hour}')
+            Content.objects.filter(pk=content.pk).update(timestamp=datetime(2024, 3, 1, hour, tzinfo=dt_timezone.utc))
+
+    def test_grouped_and_filtered_by_local_date(self):
+        self.assertEqual(Content.objects.count_by_local_date(tzinfo='UTC'), {date(2024, 3, 1): 2})
+        with timezone.override('Asia/Jakarta'):
+            self.assertEqual(Content.objects.count_by_local_date(), {date(2024, 3, 1): 1, date(2024, 3, 2): 1})
+            self.assertEqual(Content.objects.on_local_date(date(2024, 3, 2)).get().title, 'At 20')
+            self.assertEqual(
+                Content.objects.get_queryset().with_local_date().get(title='At 20').local_date, date(2024, 3, 2)
+            )
+
+    def test_local_dates_follow_daylight_saving(self):
+        Content.objects.all().delete()
+        for moment in ((2024, 3, 10, 4, 30), (2024, 3, 10, 12), (2024, 11, 3, 4, 30)):
+            content = Content.objects.create(title=str(moment))
+            Content.objects.filter(pk=content.pk).update(timestamp=datetime(*moment, tzinfo=dt_timezone.utc))
+        self.assertEqual(Content.objects.count_by_local_date(tzinfo='America/Toronto'), {
+            date(2024, 3, 9): 1, date(2024, 3, 10): 1, date(2024, 11, 3): 1,
+        })
+
+    def test_local_time_helpers(self):
+        moment = datetime(2024, 3, 1, 20, tzinfo=dt_timezone.utc)
+        self.assertEqual(get_date_time_local(moment, 'Asia/Jakarta').day, 2)
+        with timezone.override('America/Toronto'):
+            self.assertEqual(get_date_time_local(moment).hour, 15)
+            self.assertEqual(last_time_today(moment), datetime(2024, 3, 1, 23, 59, 59, 999999))
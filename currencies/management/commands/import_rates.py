@@ -0,0 +1,31 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from currencies.models import CURRENCY_CODES, ExchangeRate
+from fincapes.parsers import parse_table
+
+
+class Command(BaseCommand):
+    help = 'Load daily exchange rates (IDR per unit) from a CSV with date, currency and rate columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--delimiter', default=',')
+
+    def handle(self, *args, **options):
+        with open(options['path'], newline='') as f:
+            rows = list(csv.DictReader(f, delimiter=options['delimiter']))
+        columns, errors = parse_table(rows, {'date': 'date', 'rate': 'amount'}, required=('date', 'rate'))
+        currencies = []
+        for row, values in enumerate(rows):
+            currency = CURRENCY_CODES.get((values.get('currency') or '').strip().upper())
+            if currency is None:
+                errors.append((row, 'currency', 'Unknown currency'))
+            currencies.append(currency)
+        if errors:
+            for row, header, message in sorted(errors):
+                # +2: header line and 1-based line numbers
+                self.stderr.write(f'line {row + 2}, {header}: {message}')
+            raise CommandError(f'{len(errors)} invalid values, nothing imported')
+
+        ExchangeRate.objects.upsert(zip(currencies, columns['date'], columns['rate']))
+        self.stdout.write(self.style.SUCCESS(f'Imported {len(rows)} exchange rates'))
@@ -0,0 +1,183 @@
+import bisect
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.translation import get_language
+from fincapes.variables import CURRENCY_CHOICES
+
+CAD = 1
+IDR = 2
+CURRENCY_CODES = {code: currency for currency, code in CURRENCY_CHOICES}
+
+# Rates are stored as IDR per one unit of the currency.
+BASE_CURRENCY = IDR
+RATE_GENERATION_KEY = 'exchange_rates:generation'
+RATE_FIELD = models.DecimalField(max_digits=18, decimal_places=6)
+AMOUNT_FIELD = models.DecimalField(max_digits=24, decimal_places=6)
+
+CURRENCY_BY_LANGUAGE = getattr(settings, 'CURRENCY_BY_LANGUAGE', {'id': IDR, 'en': CAD})
+
+
+class ExchangeRateQuerySet(models.query.QuerySet):
+    def for_currency(self, currency):
+        return self.filter(currency=currency)
+
+    def effective_on(self, currency, date):
+        # latest published rate on or before ``date``
+        return self.filter(currency=currency, date__lte=date).order_by('-date')
+
+
+class ExchangeRateManager(models.Manager):
+    def get_queryset(self):
+        return ExchangeRateQuerySet(self.model, using=self._db)
+
+    def for_currency(self, currency):
+        return self.get_queryset().for_currency(currency)
+
+    def effective_on(self, currency, date):
+        return self.get_queryset().effective_on(currency, date)
+
+    def upsert(self, rates):
+        """Insert or update ``(currency, date, rate)`` rows in bulk."""
+        objs = [self.model(currency=currency, date=date, rate=rate) for currency, date, rate in rates]
+        self.bulk_create(
+            objs, update_conflicts=True, unique_fields=['currency', 'date'], update_fields=['rate', 'updated']
+        )
+        invalidate_rate_table(using=self.db)
+        return objs
+
+
+class ExchangeRate(models.Model):
+    currency = models.SmallIntegerField(choices=CURRENCY_CHOICES)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=6, help_text='IDR per one unit of the currency')
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = ExchangeRateManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_exchange_rate_per_day')
+        ]
+
+    def __str__(self):
+        return f'{self.get_currency_display()} {self.date}: {self.rate}'
+
+
+class RateTable(object):
+    """
+    Every rate in memory, per currency sorted by date, so a lookup is a
+    bisect and converting a list costs one lookup per distinct
+    (currency, date).
+    """
+    def __init__(self, rows, generation=None):
+        self.generation = generation
+        self.dates = {}
+        self.rates = {}
+        for currency, date, rate in sorted(rows):
+            self.dates.setdefault(currency, []).append(date)
+            self.rates.setdefault(currency, []).append(rate)
+
+    def rate(self, currency, date):
+        if currency == BASE_CURRENCY:
+            return Decimal(1)
+        index = bisect.bisect_right(self.dates.get(currency, []), date) - 1
+        if index < 0:
+            return None
+        return self.rates[currency][index]
+
+    def factor(self, from_currency, to_currency, date):
+        if from_currency == to_currency:
+            return Decimal(1)
+        rate_from = self.rate(from_currency, date)
+        rate_to = self.rate(to_currency, date)
+        if rate_from is None or rate_to is None:
+            return None
+        return rate_from / rate_to
+
+    def convert(self, amount, from_currency, to_currency, date=None):
+        factor = self.factor(from_currency, to_currency, date or timezone.localdate())
+        if amount is None or factor is None:
+            return None
+        return Decimal(amount) * factor
+
+    def convert_many(self, amounts, currencies, dates, to_currency):
+        """Convert parallel lists of amounts, currencies and dates; None where no rate is known."""
+        factors = {}
+        converted = []
+        for amount, currency, date in zip(amounts, currencies, dates):
+            key = (currency, date)
+            if key not in factors:
+                factors[key] = self.factor(currency, to_currency, date)
+            factor = factors[key]
+            converted.append(None if amount is None or factor is None else Decimal(amount) * factor)
+        return converted
+
+
+_rate_table = None
+
+
+def get_rate_table():
+    # Reloaded only when an import or save bumped the generation.
+    global _rate_table
+    generation = cache.get(RATE_GENERATION_KEY)
+    if _rate_table is None or _rate_table.generation != generation:
+        rows = ExchangeRate.objects.values_list('currency', 'date', 'rate')
+        _rate_table = RateTable(rows, generation)
+    return _rate_table
+
+
+def bump_rate_generation():
+    cache.set(RATE_GENERATION_KEY, time.time_ns(), None)
+
+
+def invalidate_rate_table(*args, **kwargs):
+    # after commit, so a table loaded meanwhile is not kept as the new one
+    transaction.on_commit(bump_rate_generation, using=kwargs.get('using'))
+
+
+post_save.connect(invalidate_rate_table, sender=ExchangeRate)
+post_delete.connect(invalidate_rate_table, sender=ExchangeRate)
+
+
+def get_viewer_currency(request=None):
+    language = getattr(request, 'LANGUAGE_CODE', None) or get_language()
+    return CURRENCY_BY_LANGUAGE.get(language, BASE_CURRENCY)
+
+
+def rate_on(currency, date):
+    """
+    Database expression for the rate of ``currency`` on ``date``; either can
+    be a field name of the queryset being annotated or a plain value.
+    """
+    if isinstance(currency, str):
+        rate = Subquery(
+            ExchangeRate.objects.effective_on(OuterRef(currency), OuterRef(date) if isinstance(date, str) else date)
+            .values('rate')[:1],
+            output_field=RATE_FIELD
+        )
+        return Case(When(**{currency: BASE_CURRENCY}, then=Value(Decimal(1))), default=rate, output_field=RATE_FIELD)
+    if currency == BASE_CURRENCY:
+        return Value(Decimal(1), output_field=RATE_FIELD)
+    return Subquery(
+        ExchangeRate.objects.effective_on(currency, OuterRef(date) if isinstance(date, str) else date)
+        .values('rate')[:1],
+        output_field=RATE_FIELD
+    )
+
+
+def converted_amount(amount, currency, date, to_currency):
+    """
+    Expression converting ``amount`` (a field name or expression) in the row's
+    ``currency`` into ``to_currency`` at the rate of the row's ``date``, so
+    reports can annotate or Sum() converted values in one query.
+    """
+    amount = F(amount) if isinstance(amount, str) else amount
+    return models.ExpressionWrapper(
+        amount * rate_on(currency, date) / rate_on(to_currency, date), output_field=AMOUNT_FIELD
+    )
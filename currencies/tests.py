@@ -0,0 +1,69 @@
+import datetime
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import Sum, Value
+from django.test import TestCase, override_settings
+from .models import CAD, IDR, ExchangeRate, converted_amount, get_rate_table
+
+DAY = datetime.date(2024, 1, 1)
+NEXT_DAY = datetime.date(2024, 1, 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ExchangeRateTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            ExchangeRate.objects.upsert([(CAD, DAY, Decimal('11000')), (CAD, NEXT_DAY, Decimal('12000'))])
+
+    def test_rate_table_lookups(self):
+        table = get_rate_table()
+        self.assertEqual(table.rate(CAD, DAY + datetime.timedelta(days=10)), Decimal('12000'))
+        self.assertIsNone(table.rate(CAD, DAY - datetime.timedelta(days=1)))
+        self.assertEqual(table.convert(2, CAD, IDR, DAY), Decimal('22000'))
+        self.assertEqual(
+            table.convert_many([22000, 10, None], [IDR, CAD, CAD], [DAY, NEXT_DAY, DAY], CAD),
+            [Decimal('2'), Decimal('10'), None],
+        )
+        with self.assertNumQueries(0):
+            self.assertIs(get_rate_table(), table)
+
+    def test_import_updates_and_invalidates(self):
+        table = get_rate_table()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('date,currency,rate\n02/01/2024,cad,"12.500,50"\n03/01/2024,CAD,12.600\n')
+            f.flush()
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('import_rates', f.name, stdout=StringIO())
+        self.assertIsNot(get_rate_table(), table)
+        self.assertEqual(get_rate_table().rate(CAD, NEXT_DAY), Decimal('12500.5'))
+        self.assertEqual(ExchangeRate.objects.count(), 3)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('date,currency,rate\n04/01/2024,USD,1\n')
+            f.flush()
+            with self.assertRaises(CommandError):
+                call_command('import_rates', f.name, stdout=StringIO(), stderr=StringIO())
+
+    def test_invalidated_after_commit(self):
+        table = get_rate_table()
+        with self.captureOnCommitCallbacks() as callbacks:
+            ExchangeRate.objects.filter(date=DAY).get().save()
+            # a process reloading before the commit keeps its generation
+            self.assertIs(get_rate_table(), table)
+        for callback in callbacks:
+            callback()
+        self.assertIsNot(get_rate_table(), table)
+
+    def test_conversion_in_database(self):
+        # each rate row stands in for a ledger line of 100 in its currency
+        qs = ExchangeRate.objects.annotate(idr=converted_amount(Value(Decimal(100)), 'currency', 'date', IDR))
+        with self.assertNumQueries(1):
+            self.assertEqual(sorted(qs.values_list('idr', flat=True)), [Decimal('1100000'), Decimal('1200000')])
+        total = ExchangeRate.objects.aggregate(
+            cad=Sum(converted_amount(Value(Decimal(100)), 'currency', 'date', CAD))
+        )['cad']
+        self.assertEqual(total, Decimal('200'))
@@ -0,0 +1,205 @@
+import pickle
+import time
+from collections import OrderedDict
+from threading import Lock
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache import caches
+
+# In-process tiers, keyed by location so every thread of a worker shares one.
+_tiers = {}
+_tiers_lock = Lock()
+
+GENERATION_KEY = 'two_tier:generation'
+
+
+class LocalTier(object):
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.lock = Lock()
+        self.generation = None
+        self.checked = 0
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            expires, pickled = item
+            if expires <= time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+        return pickled
+
+    def set(self, key, pickled, ttl):
+        with self.lock:
+            self.data[key] = (time.monotonic() + ttl, pickled)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def count(self, event, amount=1):
+        with self.lock:
+            self.stats[event] += amount
+
+
+class TwoTierCache(BaseCache):
+    """
+    A bounded in-process LRU in front of the shared cache alias named by
+    ``LOCATION``.
+
+    Local entries live at most ``LOCAL_TIMEOUT`` seconds, which bounds how
+    long another process may read an overwritten value. Deletes bump a
+    generation counter in the shared tier; every process compares it at most
+    once per ``CHECK_INTERVAL`` seconds and drops its local tier when it
+    changed.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.check_interval = options.get('CHECK_INTERVAL', 1)
+        self.shared_alias = location
+        with _tiers_lock:
+            self.local = _tiers.setdefault(
+                location, LocalTier(options.get('LOCAL_MAX_ENTRIES', 1000))
+            )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_ttl(self, timeout):
+        expiry = self.get_backend_timeout(timeout)
+        if expiry is None:
+            return self.local_timeout
+        return max(min(self.local_timeout, expiry - time.time()), 0)
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if now - self.local.checked < self.check_interval:
+            return
+        generation = self.shared.get(GENERATION_KEY)
+        if generation != self.local.generation:
+            self.local.clear()
+            self.local.generation = generation
+        self.local.checked = now
+
+    def _bump_generation(self):
+        generation = time.time_ns()
+        self.shared.set(GENERATION_KEY, generation, None)
+        self.local.generation = generation
+        self.local.checked = time.monotonic()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            local_key = self.make_and_validate_key(key, version=version)
+            self.local.set(local_key, pickle.dumps(value, self.pickle_protocol), self._local_ttl(timeout))
+        return added
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self._check_generation()
+        pickled = self.local.get(local_key)
+        if pickled is not None:
+            self.local.count('local_hits')
+            return pickle.loads(pickled)
+
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            self.local.count('misses')
+            return default
+        self.local.count('shared_hits')
+        self.local.set(local_key, pickle.dumps(value, self.pickle_protocol), self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._check_generation()
+        result = {}
+        missing = []
+        for key in keys:
+            pickled = self.local.get(self.make_and_validate_key(key, version=version))
+            if pickled is None:
+                missing.append(key)
+            else:
+                result[key] = pickle.loads(pickled)
+        self.local.count('local_hits', len(result))
+
+        if missing:
+            found = self.shared.get_many(missing, version=version)
+            for key, value in found.items():
+                local_key = self.make_and_validate_key(key, version=version)
+                self.local.set(local_key, pickle.dumps(value, self.pickle_protocol), self.local_timeout)
+            self.local.count('shared_hits', len(found))
+            self.local.count('misses', len(missing) - len(found))
+            result.update(found)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        local_key = self.make_and_validate_key(key, version=version)
+        self.local.set(local_key, pickle.dumps(value, self.pickle_protocol), self._local_ttl(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        ttl = self._local_ttl(timeout)
+        for key, value in data.items():
+            if key not in failed:
+                local_key = self.make_and_validate_key(key, version=version)
+                self.local.set(local_key, pickle.dumps(value, self.pickle_protocol), ttl)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Counters are read back from the shared tier, they are not worth a
+        # generation bump on every increment.
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        deleted = self.shared.delete(key, version=version)
+        self._bump_generation()
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.local.delete(self.make_and_validate_key(key, version=version))
+        self.shared.delete_many(keys, version=version)
+        self._bump_generation()
+
+    def has_key(self, key, version=None):
+        self._check_generation()
+        if self.local.get(self.make_and_validate_key(key, version=version)) is not None:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+        self._bump_generation()
+
+    def hit_ratios(self):
+        stats = dict(self.local.stats)
+        total = sum(stats.values())
+        stats['local_ratio'] = stats['local_hits'] / total if total else 0
+        stats['shared_ratio'] = stats['shared_hits'] / total if total else 0
+        stats['hit_ratio'] = (stats['local_hits'] + stats['shared_hits']) / total if total else 0
+        return stats
@@ -0,0 +1,42 @@
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+
+# Applied to every new connection, override per database with
+# DATABASES[...]['OPTIONS']['pragmas'].
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 134217728,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(SQLiteDatabaseWrapper):
+    """
+    SQLite backend tuned for several worker processes sharing one file:
+    WAL journal, relaxed fsync, a busy timeout instead of immediate
+    "database is locked" errors, and write transactions that take the
+    write lock up front (``BEGIN IMMEDIATE``) so they queue on the busy
+    timeout rather than failing on lock upgrade.
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        options = self.settings_dict['OPTIONS']
+        pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        if self.is_in_memory_db():
+            pragmas.pop('journal_mode', None)
+        for name, value in pragmas.items():
+            conn.execute('PRAGMA {} = {}'.format(name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode', 'IMMEDIATE')
+        self.cursor().execute('BEGIN {}'.format(mode) if mode else 'BEGIN')
@@ -0,0 +1,57 @@
+import pendulum
+from functools import lru_cache
+from django.conf import settings
+from django.utils.translation import get_language
+
+
+class LocaleFormatter:
+    """
+    Currency and date formatting for one language. Patterns and month/day
+    names are looked up from pendulum once, so formatting a value is plain
+    string work instead of a pendulum object per call.
+    """
+
+    def __init__(self, language):
+        self.language = language
+        locale = language
+        try:
+            pendulum.date(2000, 1, 1).format('MMMM', locale=locale)
+        except ValueError:
+            locale = settings.LANGUAGE_CODE
+        is_id = language == 'id'
+        self.currency_suffix = ',-' if is_id else '.-'
+        self.day_first = is_id
+        self.dot_grouping = is_id
+        self.months = [None] + [pendulum.date(2000, m, 1).format('MMMM', locale=locale) for m in range(1, 13)]
+        # 2001-01-01 is a Monday, as is date.weekday() == 0
+        self.days = [pendulum.date(2001, 1, 1 + d).format('dddd', locale=locale) for d in range(7)]
+
+    def currency(self, amount):
+        value = f'{int(amount):,}'
+        if self.dot_grouping:
+            value = value.replace(',', '.')
+        return value + self.currency_suffix
+
+    def date(self, value):
+        if self.day_first:
+            return '%02d/%02d/%04d' % (value.day, value.month, value.year)
+        return '%02d/%02d/%04d' % (value.month, value.day, value.year)
+
+    def full_date(self, value, day_name=False):
+        text = '%02d %s %04d' % (value.day, self.months[value.month], value.year)
+        return self.days[value.weekday()] + ' ' + text if day_name else text
+
+    def today(self, value):
+        if self.day_first:
+            return self.full_date(value)
+        return '%s %02d, %04d' % (self.months[value.month], value.day, value.year)
+
+
+@lru_cache(maxsize=None)
+def get_formatter(language=None):
+    return LocaleFormatter(language or settings.LANGUAGE_CODE)
+
+
+def get_active_formatter(language=None):
+    """The formatter for ``language``, else for the active translation."""
+    return get_formatter(language or get_language())
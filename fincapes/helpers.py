@@ -1,12 +1,41 @@
+import csv
+import datetime
+import hashlib
 import logging
 import pendulum
+import re
+import time
+from functools import partial
+from tempfile import TemporaryFile
+from zoneinfo import ZoneInfo
+from pendulum.parsing.exceptions import ParserError
+from html import escape, unescape
+from html.parser import HTMLParser
 from ajax_datatable.views import AjaxDatatableView
-from django.core.exceptions import ValidationError
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.http import FileResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.core.validators import validate_email
+from django.utils import timezone, translation
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+from django.utils.decorators import method_decorator
 from django.utils.translation import get_language
+from django.views.decorators.csrf import csrf_exempt
 from crispy_forms.layout import BaseInput, Field
 from crispy_forms.utils import get_template_pack
 from django import forms
+from django_quill.quill import QuillParseError
+from fincapes.formatters import get_active_formatter, get_formatter
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +68,86 @@ class PercentageField(forms.FloatField):
         return val
     
 
+def datatable_count_key(model, *parts):
+    return ':'.join(('datatable_count', model._meta.label_lower) + tuple(str(part) for part in parts))
+
+
+def bump_datatable_counts(model):
+    cache.set(datatable_count_key(model, 'generation'), time.time_ns(), None)
+
+
+def invalidate_datatable_counts(sender, **kwargs):
+    # after commit, so a count taken meanwhile is not cached as the new one
+    transaction.on_commit(partial(bump_datatable_counts, sender), using=kwargs.get('using'))
+
+
+def connect_datatable_counts(model):
+    uid = 'datatable_count:' + model._meta.label_lower
+    post_save.connect(invalidate_datatable_counts, sender=model, dispatch_uid=uid)
+    post_delete.connect(invalidate_datatable_counts, sender=model, dispatch_uid=uid)
+
+
+def cursor_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+class Echo(object):
+    def write(self, value):
+        return value
+
+
+def keep_request_locale(rows):
+    """
+    Iterate ``rows`` under the timezone and language active now. A streamed
+    body is consumed after the middleware has reset them.
+    """
+    zone = timezone.get_current_timezone()
+    language = translation.get_language()
+
+    def generate():
+        while True:
+            with timezone.override(zone), translation.override(language):
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+            yield row
+    return generate()
+
+
+def get_attribute_path(obj, path):
+    for name in path.split('__'):
+        if obj is None:
+            return None
+        obj = getattr(obj, name)
+    return obj
+
+
 class DatatableView(AjaxDatatableView):
+    """
+    With ``keyset_pagination`` the next page is read with a seek on the sort
+    column (plus pk) from the cursor returned with the previous draw, instead
+    of OFFSET, and the total and filtered counts are cached until a row of
+    ``model`` is saved or deleted. Jumps to an arbitrary page, multi-column
+    orders and a cursor row with a NULL sort value fall back to OFFSET.
+    ajax_datatable's bundled utils.js does not send ``cursor`` back, so with
+    the stock client every page is read through OFFSET; the client has to
+    post the previous response's ``cursor`` with the next draw (e.g. from
+    DataTables' ``ajax.data``) for the seek to be used.
+
+    ``?action=export&format=csv|xlsx`` with the table's usual search and
+    order parameters downloads every matching row.
+    """
+    keyset_pagination = False
+    count_cache_timeout = 60 * 15
+    cursor_salt = 'fincapes.datatable.cursor'
+    keyset_ordering = None
+    export_chunk_size = 2000
+
     def get_table_row_id(self, request, obj):
         result = ''
         if self.table_row_id_fieldname:
@@ -48,6 +156,207 @@ class DatatableView(AjaxDatatableView):
             except:
                 result = ''
         return result
+
+    def __init_subclass__(cls, **kwargs):
+        # connected when the view is defined, so saves from any process
+        # (workers, commands, the shell) invalidate the cached counts
+        super().__init_subclass__(**kwargs)
+        if cls.keyset_pagination and cls.model is not None:
+            connect_datatable_counts(cls.model)
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        if initkwargs.get('keyset_pagination') and initkwargs.get('model', cls.model) is not None:
+            connect_datatable_counts(initkwargs.get('model', cls.model))
+        return super().as_view(**initkwargs)
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        query_dict = request.GET if request.method == 'GET' else request.POST
+        if query_dict.get('action') == 'export':
+            request.REQUEST = query_dict
+            self.initialize(request)
+            return self.export(request, query_dict.get('format', 'csv'))
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_export_queryset(self, request):
+        # same filters and order as the table, without the paging parameters
+        query_dict = request.REQUEST.copy()
+        for field in ('draw', 'start', 'length'):
+            query_dict.setdefault(field, '0')
+        params = self.read_parameters(query_dict)
+        qs = self.get_initial_queryset(request)
+        if not self.disable_queryset_optimization:
+            qs = self.optimize_queryset(qs)
+        return self.prepare_queryset(params, qs)
+
+    def get_export_columns(self):
+        return [
+            column for column in self.column_specs
+            if column['name'] and column['visible'] and not column['placeholder']
+        ]
+
+    def get_export_filename(self, fmt):
+        return '{}.{}'.format(self.model._meta.model_name, fmt)
+
+    def export_rows(self, request):
+        return keep_request_locale(self.iter_export_rows(request))
+
+    def iter_export_rows(self, request):
+        columns = self.get_export_columns()
+        yield [str(column['title'] or column['name']) for column in columns]
+        for obj in self.get_export_queryset(request).iterator(chunk_size=self.export_chunk_size):
+            row = {column['name']: self.render_column(obj, column['name']) for column in columns}
+            self.customize_row(row, obj)
+            yield [row[column['name']] for column in columns]
+
+    def export(self, request, fmt):
+        if fmt == 'csv':
+            writer = csv.writer(Echo())
+            response = StreamingHttpResponse(
+                (writer.writerow(row) for row in self.export_rows(request)),
+                content_type='text/csv'
+            )
+            response['Content-Disposition'] = 'attachment; filename="{}"'.format(self.get_export_filename(fmt))
+            return response
+        if fmt == 'xlsx' and xlsxwriter is not None:
+            # constant_memory flushes every row to disk as it is written
+            output = TemporaryFile()
+            workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+            worksheet = workbook.add_worksheet()
+            for index, row in enumerate(self.export_rows(request)):
+                worksheet.write_row(index, 0, row)
+            workbook.close()
+            output.seek(0)
+            return FileResponse(
+                output, as_attachment=True, filename=self.get_export_filename(fmt),
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+        return HttpResponseBadRequest()
+
+    def get_keyset_ordering(self, qs):
+        ordering = qs.query.order_by
+        if len(ordering) != 1 or not isinstance(ordering[0], str) or '?' in ordering[0]:
+            return None
+        field = ordering[0].lstrip('-')
+        if field in ('pk', self.model._meta.pk.name):
+            return None
+        return ordering[0]
+
+    def sort_queryset(self, params, qs):
+        qs = super().sort_queryset(params, qs)
+        ordering = self.keyset_ordering = self.get_keyset_ordering(qs) if self.keyset_pagination else None
+        if ordering:
+            # pk breaks ties so the seek never skips or repeats rows
+            field = ordering.lstrip('-')
+            if not self.is_unique_field(field):
+                qs = qs.order_by(ordering, '-pk' if ordering.startswith('-') else 'pk')
+            only, defer = qs.query.deferred_loading
+            if only and not defer:
+                qs = qs.only(*only, field)
+        return qs
+
+    def is_unique_field(self, field):
+        try:
+            return self.model._meta.get_field(field).unique
+        except FieldDoesNotExist:
+            return False
+
+    def count_key(self, name, qs):
+        # keyed by the SQL, so views with different initial querysets on the
+        # same model never share a count; None when the query can match nothing
+        try:
+            sql = str(qs.order_by().query)
+        except EmptyResultSet:
+            return None
+        return datatable_count_key(self.model, name, hashlib.md5(sql.encode()).hexdigest())
+
+    def get_counts(self, request, qs):
+        generation_key = datatable_count_key(self.model, 'generation')
+        querysets = {'total': self.get_initial_queryset(request), 'filtered': qs}
+        keys = {name: self.count_key(name, queryset) for name, queryset in querysets.items()}
+        values = cache.get_many([generation_key] + [key for key in keys.values() if key])
+        generation = values.get(generation_key)
+
+        counts = {}
+        for name, key in keys.items():
+            if key is None:
+                counts[name] = 0
+                continue
+            entry = values.get(key)
+            if entry is not None and entry[0] == generation:
+                counts[name] = entry[1]
+                continue
+            counts[name] = querysets[name].count()
+            cache.set(key, (generation, counts[name]), self.count_cache_timeout)
+        return counts['total'], counts['filtered']
+
+    def make_cursor(self, obj, ordering, start):
+        value = get_attribute_path(obj, ordering.lstrip('-'))
+        if value is None:
+            return None
+        return signing.dumps([start, ordering, cursor_value(value), obj.pk], salt=self.cursor_salt)
+
+    def seek_queryset(self, request, qs, ordering, start_pos):
+        cursor = request.REQUEST.get('cursor')
+        if not cursor:
+            return None
+        try:
+            start, cursor_ordering, value, pk = signing.loads(cursor, salt=self.cursor_salt)
+        except signing.BadSignature:
+            return None
+        if start != start_pos or cursor_ordering != ordering:
+            return None
+        field = ordering.lstrip('-')
+        descending = ordering.startswith('-')
+        lookup = 'lt' if descending else 'gt'
+        if self.is_unique_field(field):
+            condition = Q(**{f'{field}__{lookup}': value})
+        else:
+            # the range condition alone is what lets the index seek
+            condition = Q(**{f'{field}__{lookup}e': value}) & (
+                Q(**{f'{field}__{lookup}': value}) | Q(**{f'pk__{lookup}': pk})
+            )
+        if self.is_nullable_field(field) and self.nulls_sort_after(qs, descending):
+            # rows with a NULL sort value come after every cursor value
+            condition |= Q(**{f'{field}__isnull': True})
+        return qs.filter(condition)
+
+    def is_nullable_field(self, field):
+        try:
+            return self.model._meta.get_field(field).null
+        except FieldDoesNotExist:
+            # a related path, NULL through the join
+            return True
+
+    def nulls_sort_after(self, qs, descending):
+        return connections[qs.db].features.nulls_order_largest != descending
+
+    def get_response_dict(self, request, paginator, draw_idx, start_pos):
+        if not self.keyset_pagination or request.REQUEST.get('length') == '-1':
+            return super().get_response_dict(request, paginator, draw_idx, start_pos)
+
+        qs = paginator.object_list
+        length = paginator.per_page
+        total, filtered = self.get_counts(request, qs)
+        start_pos = max(min(start_pos, filtered - 1), 0) // length * length
+        ordering = self.keyset_ordering
+        page = None
+        if ordering:
+            page = self.seek_queryset(request, qs, ordering, start_pos)
+        if page is None:
+            page = qs[start_pos:]
+        objects = list(page[:length])
+
+        response = {
+            "draw": draw_idx,
+            "recordsTotal": total,
+            "recordsFiltered": filtered,
+            "data": self.prepare_results(request, objects),
+        }
+        if ordering and objects:
+            response['cursor'] = self.make_cursor(objects[-1], ordering, start_pos + length)
+        return response
         
 
 def is_number(s):
@@ -56,7 +365,7 @@ def is_number(s):
     try:
         float(s)
         return True
-    except KeyError:
+    except (TypeError, ValueError):
         return False
     
     
@@ -80,7 +389,7 @@ def check_date_valid(s):
         )
         correct_date = True
         return correct_date, new_date
-    except ValueError:
+    except (IndexError, ValueError):
         new_date = None
         correct_date = False
         return correct_date, new_date
@@ -109,40 +418,125 @@ def remove_session(request, session_name):
 
 
 def get_current_full_date(location='Asia/Jakarta'):
-    dt = pendulum.today(tz=location)
-    bhs = get_language()
-    pattern = 'DD MMMM YYYY' if bhs == 'id' else 'MMMM DD, YYYY'
-    return dt.format(pattern, locale=bhs)
+    return get_active_formatter().today(datetime.datetime.now(ZoneInfo(location)))
 
 
 def get_locale_full_date(date_model, day_name_include=False):
-    year = date_model.year
-    month = date_model.month
-    day = date_model.day
-    tgl = pendulum.date(year, month, day)
-    bhs = get_language()
-    pattern = 'dddd DD MMMM YYYY' if day_name_include else 'DD MMMM YYYY'
-    return tgl.format(pattern, locale=bhs)
+    return get_active_formatter().full_date(date_model, day_name=day_name_include)
 
 
 def get_locale_date(tgl, bhs=None):
     try:
-        bhs = get_language() if bhs is None else bhs
-        pattern = 'DD/MM/YYYY' if bhs == 'id' else 'MM/DD/YYYY'
-        year = tgl.year
-        month = tgl.month
-        day = tgl.day
-        dt = pendulum.date(year, month, day)
-        return dt.format(pattern)
-    except:
-        tgl_ = pendulum.today(tz='Asia/Jakarta')
-        return tgl_.format('DD/MM/YYYY')
-
-
-def get_date_human(tanggal):
+        return get_active_formatter(bhs).date(tgl)
+    except (AttributeError, TypeError, ValueError):
+        return get_formatter('id').date(datetime.datetime.now(ZoneInfo('Asia/Jakarta')))
+
+
+def get_date_human(tanggal, now=None, locale=None):
+    if not tanggal:
+        return None
+    try:
+        dt = pendulum.parse(tanggal) if isinstance(tanggal, str) else pendulum.instance(tanggal)
+        # worded relative to now ("2 hours ago"), also when a shared now is passed
+        return pendulum.format_diff(dt.diff(now or pendulum.now('UTC')), is_now=True, locale=locale or get_language())
+    except (ValueError, TypeError, ParserError):
+        logger.warning('Cannot humanize date %r', tanggal)
+        return None
+
+
+def humanize_dates(objects, field='timestamp', to_attr=None, locale=None):
+    # One "now" and one locale lookup shared by every row.
+    now = pendulum.now('UTC')
+    locale = locale or get_language()
+    result = []
+    for obj in objects:
+        value = get_date_human(getattr(obj, field), now=now, locale=locale)
+        if to_attr:
+            setattr(obj, to_attr, value)
+        result.append(value)
+    return result
+
+
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'code', 'em', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'i', 'iframe', 'img', 'li', 'ol', 'p', 'pre', 's', 'span', 'strong', 'sub',
+    'sup', 'u', 'ul'
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'iframe': {'src', 'allowfullscreen', 'frameborder'},
+    'li': {'data-list'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+URL_SCHEMES = ('http://', 'https://', 'mailto:', '/', '#')
+# Quill embeds pasted and uploaded images as base64 data URLs
+IMAGE_DATA_URLS = tuple('data:image/%s;base64,' % fmt for fmt in ('png', 'jpeg', 'gif', 'webp'))
+VOID_TAGS = {'br', 'img'}
+DROP_CONTENT_TAGS = {'script', 'style'}
+BLOCK_END_RE = re.compile(r'<(br|/p|/li|/h\d|/blockquote|/pre)\b[^>]*>')
+
+
+class HTMLSanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.output = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip += 1
+            return
+        if self.skip or tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        parts = [tag]
+        for name, value in attrs:
+            value = value or ''
+            if name == 'class' and value.startswith('ql-'):
+                parts.append('class="%s"' % escape(value))
+            elif name in allowed:
+                if name in URL_ATTRIBUTES and not self.allowed_url(tag, name, value):
+                    continue
+                parts.append('%s="%s"' % (name, escape(value)))
+        self.output.append('<%s>' % ' '.join(parts))
+
+    def allowed_url(self, tag, name, value):
+        value = value.strip().lower()
+        if tag == 'img' and name == 'src' and value.startswith(IMAGE_DATA_URLS):
+            return True
+        return value.startswith(URL_SCHEMES)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip = max(self.skip - 1, 0)
+            return
+        if self.skip or tag not in ALLOWED_TAGS or tag in VOID_TAGS:
+            return
+        self.output.append('</%s>' % tag)
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.output.append(escape(data, quote=False))
+
+
+def sanitize_html(html):
+    parser = HTMLSanitizer()
+    parser.feed(html or '')
+    parser.close()
+    return ''.join(parser.output)
+
+
+def render_quill(field_quill, excerpt_length=300):
     try:
-        bahasa = get_language()
-        dt = pendulum.parse(tanggal)
-        return dt.diff_for_humans(locale=bahasa)
-    except:
-        return False
\ No newline at end of file
+        html = sanitize_html(field_quill.html) if field_quill is not None else ''
+    except QuillParseError:
+        logger.warning('Failed to parse quill content')
+        html = ''
+    spaced = BLOCK_END_RE.sub(r'\g<0> ', html)
+    plain = ' '.join(unescape(strip_tags(spaced)).split())
+    return {
+        'html': html,
+        'excerpt': Truncator(plain).chars(excerpt_length),
+        'words': len(plain.split()),
+    }
@@ -0,0 +1,434 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import SpooledTemporaryFile
+import shortuuid
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.images import get_image_dimensions
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models.fields.files import ImageFieldFile
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET
+from PIL import Image as PILImage, ImageOps
+from thumbnails import conf, fields, images, post_processors, processors
+from thumbnails.backends import metadata, storage
+from thumbnails.backends.metadata import ImageMeta
+from thumbnails.files import ThumbnailedImageFile
+from thumbnails.models import Source, ThumbnailMeta
+
+logger = logging.getLogger(__name__)
+
+# da-vinci 0.3, used by django-thumbnails to resize, still refers to the
+# ANTIALIAS alias that Pillow 10 removed.
+if not hasattr(PILImage, 'ANTIALIAS'):
+    PILImage.ANTIALIAS = PILImage.LANCZOS
+
+
+def get_queue_dir():
+    return getattr(settings, 'THUMBNAIL_QUEUE_DIR', os.path.join(settings.BASE_DIR, 'cdn', 'queue', 'thumbnails'))
+
+
+def enqueue_thumbnails(source_name, sizes):
+    # One JSON file per job; written under a temporary name and renamed so
+    # the worker never picks up a half-written file.
+    queue_dir = get_queue_dir()
+    os.makedirs(queue_dir, exist_ok=True)
+    job_name = '{}-{}'.format(time.time_ns(), shortuuid.uuid())
+    tmp_path = os.path.join(queue_dir, job_name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump({'source': source_name, 'sizes': list(sizes)}, f)
+    os.replace(tmp_path, os.path.join(queue_dir, job_name + '.json'))
+
+
+def pending_jobs():
+    queue_dir = get_queue_dir()
+    if not os.path.isdir(queue_dir):
+        return []
+    return sorted(
+        os.path.join(queue_dir, name) for name in os.listdir(queue_dir) if name.endswith('.json')
+    )
+
+
+def claim_job(path):
+    claimed = path[:-len('.json')] + '.claimed'
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        # another worker took it
+        return None
+    return claimed
+
+
+def generate_thumbnails(source_name, sizes):
+    metadata_backend = metadata.get_backend()
+    storage_backend = storage.get_backend()
+    if not storage_backend.exists(source_name):
+        logger.warning('Thumbnail source %s no longer exists', source_name)
+        return []
+    created = []
+    for size in sizes:
+        if images.get(source_name, size, metadata_backend, storage_backend) is None:
+            images.create(source_name, size, metadata_backend, storage_backend)
+            created.append(size)
+    return created
+
+
+def run_job(path):
+    with open(path) as f:
+        job = json.load(f)
+    try:
+        generate_thumbnails(job['source'], job['sizes'])
+    except Exception:
+        logger.exception('Thumbnail job %s failed', path)
+        os.replace(path, path[:-len('.claimed')] + '.failed')
+        return False
+    os.remove(path)
+    return True
+
+
+def init_worker():
+    import django
+    django.setup()
+    from django.db import connections
+    connections.close_all()
+
+
+def thumbnail_pool(processes):
+    return ProcessPoolExecutor(max_workers=processes, initializer=init_worker)
+
+
+def process_queue(executor=None):
+    jobs = [claimed for claimed in map(claim_job, pending_jobs()) if claimed]
+    if executor is None:
+        return sum(run_job(path) for path in jobs)
+    return sum(executor.map(run_job, jobs))
+
+
+def thumbnail_url(image, size):
+    """
+    URL of an already generated thumbnail, or of the original image while the
+    worker has not produced it yet. Never generates inline.
+    """
+    if not image:
+        return ''
+    thumbnail = image.thumbnails.all().get(size)
+    if thumbnail:
+        return thumbnail.url
+    return image.url
+
+
+def prefetch_thumbnails(instances, field='photo', sizes=None):
+    """
+    Load the thumbnail metadata of every instance in one query and attach it,
+    so ``image.thumbnails.<size>`` and ``thumbnail_url`` need no query per row.
+    """
+    files = [getattr(instance, field) for instance in instances]
+    files = [file for file in files if file]
+    if not files:
+        return instances
+    metas = ThumbnailMeta.objects.filter(source__name__in={file.name for file in files})
+    if sizes:
+        metas = metas.filter(size__in=sizes)
+    found = {}
+    for source_name, size, name in metas.values_list('source__name', 'size', 'name'):
+        found.setdefault(source_name, {})[size] = name
+    for file in files:
+        thumbnails = file.thumbnails
+        thumbnails._thumbnails = {
+            size: images.Thumbnail(ImageMeta(file.name, name, size), thumbnails.storage)
+            for size, name in found.get(file.name, {}).items()
+        }
+    return instances
+
+
+class ThumbnailQuerySetMixin(object):
+    thumbnail_field = 'photo'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._thumbnail_sizes = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._thumbnail_sizes = self._thumbnail_sizes
+        return clone
+
+    def with_thumbnails(self, *sizes):
+        clone = self._chain()
+        clone._thumbnail_sizes = sizes
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is not None
+        super()._fetch_all()
+        if not fetched and self._thumbnail_sizes is not None:
+            instances = [obj for obj in self._result_cache if isinstance(obj, self.model)]
+            prefetch_thumbnails(instances, self.thumbnail_field, self._thumbnail_sizes)
+
+
+# formats stored as they are, anything else is re-encoded as JPEG
+IMAGE_INGEST_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def get_ingest_max_size():
+    return getattr(settings, 'IMAGE_INGEST_MAX_SIZE', (2560, 2560))
+
+
+def ingest_image(file, max_size=None):
+    """
+    Cap an upload to ``max_size`` and strip its metadata (EXIF, ICC, comments)
+    before it is stored. JPEGs are scaled down by the decoder itself, so a
+    camera original is never decoded at full resolution, and the result is
+    spooled to disk past FILE_UPLOAD_MAX_MEMORY_SIZE. Returns the new file and
+    its extension.
+    """
+    max_size = max_size or get_ingest_max_size()
+    file.seek(0)
+    image = PILImage.open(file)
+    fmt = image.format if image.format in IMAGE_INGEST_FORMATS else 'JPEG'
+    scale = min(max_size[0] / image.width, max_size[1] / image.height, 1)
+    image.draft('RGB', (int(image.width * scale), int(image.height * scale)))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size)
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.info = {key: image.info[key] for key in ('transparency',) if key in image.info}
+
+    output = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    if fmt == 'PNG':
+        image.save(output, fmt, optimize=True)
+    else:
+        image.save(output, fmt, quality=getattr(settings, 'IMAGE_INGEST_QUALITY', 85))
+    output.seek(0)
+    return File(output), IMAGE_INGEST_FORMATS[fmt]
+
+
+def hash_file(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def image_fields():
+    for model in apps.get_models():
+        for field in model._meta.fields:
+            if isinstance(field, ImageField):
+                yield model, field
+
+
+def count_references(name, exclude=None):
+    count = 0
+    for model, field in image_fields():
+        qs = model._default_manager.filter(**{field.name: name})
+        if exclude is not None and isinstance(exclude, model):
+            qs = qs.exclude(pk=exclude.pk)
+        count += qs.count()
+    return count
+
+
+def register_source(metadata_backend, name):
+    # identical uploads share a name, so the source may already be known
+    try:
+        source = metadata_backend.get_source(name)
+    except Source.DoesNotExist:
+        source = None
+    if source is None:
+        try:
+            with transaction.atomic():
+                metadata_backend.add_source(name)
+        except IntegrityError:
+            pass
+
+
+class ContentAddressedImageFile(ThumbnailedImageFile):
+    def save(self, name, content, save=True):
+        ImageFieldFile.save(self, name, content, save)
+        register_source(self.metadata_backend, self.name)
+
+    def delete(self, with_thumbnails=True, save=True):
+        # Identical uploads share one file: only the last reference removes
+        # it (and its thumbnails). django_cleanup deletes after the row has
+        # changed, so the row itself no longer counts then.
+        if self.name and count_references(self.name, exclude=self.instance):
+            self.name = None
+            setattr(self.instance, self.field.attname, self.name)
+            self._committed = False
+            if save:
+                self.instance.save()
+            return
+        if self.name:
+            delete_variants(self.name, self.storage)
+        super().delete(with_thumbnails=with_thumbnails, save=save)
+
+
+class ImageField(fields.ImageField):
+    """
+    Same as thumbnails.fields.ImageField, except that uploads are capped to
+    IMAGE_INGEST_MAX_SIZE without metadata, stored by content hash (identical
+    files are kept once) and ``pregenerated_sizes`` are queued for the
+    thumbnail worker instead of being rendered (and post-processed) inside the
+    upload request.
+    """
+    attr_class = ContentAddressedImageFile
+
+    def pre_save(self, model_instance, add):
+        file = getattr(model_instance, self.attname)
+
+        if file and not file._committed:
+            image_file = file
+            file_type = os.path.splitext(file.name)[1]
+
+            if self.resize_source_to:
+                file.seek(0)
+                image_file = processors.process(file, self.resize_source_to)
+                image_file = post_processors.process(image_file, self.resize_source_to)
+                if 'FORMAT' in conf.SIZES[self.resize_source_to]:
+                    file_type = ".{}".format(conf.SIZES[self.resize_source_to]['FORMAT'])
+            else:
+                try:
+                    image_file, file_type = ingest_image(file)
+                except OSError:
+                    logger.warning('Could not ingest %s, storing it as uploaded', file.name)
+
+            filename = hash_file(image_file) + file_type
+            name = self.generate_filename(model_instance, filename)
+            if self.storage.exists(name):
+                file.name = name
+                file._committed = True
+                register_source(file.metadata_backend, name)
+            else:
+                file.save(filename, image_file, save=False)
+            if self.pregenerated_sizes:
+                enqueue_thumbnails(file.name, self.pregenerated_sizes)
+
+        return file
+
+
+
+IMAGE_VARIANT_WIDTHS = getattr(settings, 'IMAGE_VARIANT_WIDTHS', (320, 640, 960, 1280))
+IMAGE_VARIANT_DIR = 'variants'
+# format -> (Pillow format name, mime type, save options)
+IMAGE_VARIANT_FORMATS = {
+    'avif': ('AVIF', 'image/avif', {'quality': 55}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+}
+
+
+def supported_variant_formats():
+    PILImage.init()
+    return [fmt for fmt, (name, _, _) in IMAGE_VARIANT_FORMATS.items() if name in PILImage.SAVE]
+
+
+def variant_name(source_name, width, fmt):
+    name = os.path.splitext(source_name)[0]
+    return '{}/{}_{}w.{}'.format(IMAGE_VARIANT_DIR, name, width, fmt)
+
+
+@lru_cache(maxsize=4096)
+def source_width(name, storage=default_storage):
+    # names are content hashes, so a name's dimensions never change
+    try:
+        with storage.open(name) as source:
+            width, height = get_image_dimensions(source)
+    except (OSError, TypeError):
+        return None
+    return width
+
+
+def variant_widths(name, widths=IMAGE_VARIANT_WIDTHS):
+    """
+    ``widths`` below the source width plus the source width itself: variants
+    are never upscaled, so wider entries would only repeat the source.
+    """
+    width = source_width(name)
+    if not width:
+        return list(widths)
+    return [w for w in widths if w < width] + [width]
+
+
+def delete_variants(source_name, storage=default_storage):
+    # every <name>_<width>w.<fmt> rendered for the source
+    directory, prefix = os.path.split('{}/{}_'.format(IMAGE_VARIANT_DIR, os.path.splitext(source_name)[0]))
+    try:
+        files = storage.listdir(directory)[1]
+    except FileNotFoundError:
+        return
+    for file in files:
+        if file.startswith(prefix) and file[len(prefix):].split('w.')[0].isdigit():
+            storage.delete(os.path.join(directory, file))
+
+
+def render_variant(source, width, fmt):
+    pil_format, _, options = IMAGE_VARIANT_FORMATS[fmt]
+    image = PILImage.open(source)
+    # lets the JPEG decoder downscale by 1/2..1/8 while decoding
+    image.draft('RGB', (width, width * image.height // max(image.width, 1)))
+    image = ImageOps.exif_transpose(image)
+    if image.width > width:
+        image.thumbnail((width, image.height * width // image.width), PILImage.LANCZOS)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image, pil_format, options
+
+
+def get_or_create_variant(source_name, width, fmt, storage=default_storage):
+    name = variant_name(source_name, width, fmt)
+    path = storage.path(name)
+    if os.path.exists(path):
+        return path
+    with storage.open(source_name) as source:
+        image, pil_format, options = render_variant(source, width, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(path, shortuuid.uuid())
+        image.save(tmp_path, pil_format, **options)
+    os.replace(tmp_path, path)
+    return path
+
+
+@require_GET
+@cache_control(public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+def image_variant(request, width, fmt, name):
+    if fmt not in supported_variant_formats():
+        raise Http404
+    if name.startswith(IMAGE_VARIANT_DIR + '/') or not default_storage.exists(name):
+        raise Http404
+    if width not in variant_widths(name):
+        raise Http404
+    path = get_or_create_variant(name, width, fmt)
+    return FileResponse(open(path, 'rb'), content_type=IMAGE_VARIANT_FORMATS[fmt][1])
+
+
+def image_srcset(image, fmt, widths=IMAGE_VARIANT_WIDTHS):
+    return ', '.join(
+        '{} {}w'.format(reverse('image-variant', args=[width, fmt, image.name]), width)
+        for width in variant_widths(image.name, widths)
+    )
+
+
+def responsive_picture(image, sizes='100vw', alt='', css_class='', widths=IMAGE_VARIANT_WIDTHS):
+    if not image:
+        return ''
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (IMAGE_VARIANT_FORMATS[fmt][1], image_srcset(image, fmt, widths), sizes)
+            for fmt in supported_variant_formats()
+        )
+    )
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async"></picture>',
+        sources, image.url, alt, css_class
+    )
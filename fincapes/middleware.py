@@ -4,10 +4,13 @@ import os
 import re
 from django.conf import settings
 from django.conf.urls.i18n import is_language_prefix_patterns_used
+from django.core.exceptions import ObjectDoesNotExist
 from django.http import HttpResponseRedirect
 from django.urls import get_script_prefix, is_valid_path
-from django.utils import translation
+from django.utils import timezone, translation
 from django.utils.cache import patch_vary_headers
+from fincapes.routers import unpin_primary
+from fincapes.timezones import get_zone
 
 try:
     from django.utils.deprecation import MiddlewareMixin
@@ -15,25 +18,71 @@ except ImportError:
     MiddlewareMixin = object
 
 
+class PrimaryPinningMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        unpin_primary()
+
+    def process_response(self, request, response):
+        unpin_primary()
+        return response
+
+
+USER_LANGUAGE_SESSION_KEY = '_user_language'
+USER_TIMEZONE_SESSION_KEY = '_user_timezone'
+
+
+def get_profile_value(request, field, session_key):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+
+    # The profile value is kept in the session together with the user's
+    # ``updated`` stamp. Saving the profile touches ``User.updated`` so the
+    # stamp no longer matches and the value is resolved again.
+    stamp = user.updated.isoformat() if user.updated else None
+    cached = request.session.get(session_key)
+    if cached and cached[1] == stamp:
+        return cached[0]
+
+    try:
+        value = getattr(user.profile, field)
+    except ObjectDoesNotExist:
+        value = None
+    request.session[session_key] = [value, stamp]
+    return value
+
+
+def get_user_language(request):
+    return get_profile_value(request, 'language', USER_LANGUAGE_SESSION_KEY)
+
+
+def get_user_timezone(request):
+    return get_profile_value(request, 'timezone', USER_TIMEZONE_SESSION_KEY)
+
+
+class TimezoneMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        # anonymous users and profiles without one get DEFAULT_USER_TIMEZONE
+        request.timezone = get_zone(get_user_timezone(request))
+        timezone.activate(request.timezone)
+
+    def process_response(self, request, response):
+        timezone.deactivate()
+        return response
+
+
 class DefaultLanguageMiddleware(MiddlewareMixin):
     response_redirect_class = HttpResponseRedirect
 
     def process_request(self, request):
-        user = getattr(request, 'user', None)
-        if user.is_authenticated:
-            language = user.profile.language
+        language = get_user_language(request)
+        if language:
             translation.activate(language)
-
+        request.user_language = language
         request.LANGUAGE_CODE = translation.get_language()
 
     def process_response(self, request, response):
-        user = getattr(request, 'user', None)
-        if not user:
-            return response
-        if not user.is_authenticated:
-            return response
-
-        user_language = getattr(user.profile, 'language', None)
+        user_language = getattr(request, 'user_language', None)
         if not user_language:
             return response
 
@@ -1,4 +1,9 @@
+import time
+from collections import Counter, defaultdict
+from threading import Lock
 from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
 from django.utils import translation
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
@@ -104,4 +109,108 @@ class ContextDataMixin(object):
         context['page_title'] = aplikasi.get('portal_app')
         context['navbar_needed'] = True
         context['show_footer'] = True
-        return context
\ No newline at end of file
+        return context
+
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60)
+PAGE_CACHE_STALE_TIMEOUT = getattr(settings, 'PAGE_CACHE_STALE_TIMEOUT', 60 * 60 * 24)
+PAGE_CACHE_LOCK_TIMEOUT = 30
+
+
+def page_cache_key(prefix, *parts):
+    return ':'.join(('page_cache', prefix) + tuple(str(part) for part in parts))
+
+
+def invalidate_page_cache(prefix):
+    # A new generation makes every stored copy stale without deleting it, so
+    # it can still be served while the first request rebuilds the page.
+    cache.set(page_cache_key(prefix, 'generation'), time.time_ns(), None)
+
+
+# Per-process counters: a shared counter would be a cache write on every
+# request, which is what the page cache is there to avoid.
+_page_cache_stats = defaultdict(Counter)
+_page_cache_stats_lock = Lock()
+
+
+def record_page_cache(prefix, event):
+    with _page_cache_stats_lock:
+        _page_cache_stats[prefix][event] += 1
+
+
+def get_page_cache_stats(prefix):
+    with _page_cache_stats_lock:
+        stats = _page_cache_stats[prefix]
+        return {event: stats[event] for event in ('hit', 'stale', 'miss')}
+
+
+def reset_page_cache_stats(prefix=None):
+    with _page_cache_stats_lock:
+        if prefix is None:
+            _page_cache_stats.clear()
+        else:
+            _page_cache_stats.pop(prefix, None)
+
+
+class PageCacheMixin(object):
+    page_cache_prefix = None
+    page_cache_timeout = PAGE_CACHE_TIMEOUT
+
+    def page_cache_allowed(self, request):
+        user = getattr(request, 'user', None)
+        return (
+            request.method in ('GET', 'HEAD') and not request.GET
+            and not (user and user.is_authenticated)
+        )
+
+    def get_page_cache_key(self, request):
+        htmx = 'htmx' if getattr(request, 'htmx', False) else 'full'
+        return page_cache_key(self.page_cache_prefix, translation.get_language(), htmx)
+
+    def page_cache_response(self, entry, state):
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['X-Page-Cache'] = state
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.page_cache_prefix or not self.page_cache_allowed(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        prefix = self.page_cache_prefix
+        generation_key = page_cache_key(prefix, 'generation')
+        key = self.get_page_cache_key(request)
+        values = cache.get_many([generation_key, key])
+        generation = values.get(generation_key)
+        entry = values.get(key)
+
+        locked = False
+        if entry is not None:
+            if entry['generation'] == generation and entry['expires'] > time.time():
+                record_page_cache(prefix, 'hit')
+                return self.page_cache_response(entry, 'hit')
+            # Only the request holding the lock rebuilds, the others keep
+            # serving the stale copy meanwhile.
+            locked = cache.add(key + ':lock', 1, PAGE_CACHE_LOCK_TIMEOUT)
+            if not locked:
+                record_page_cache(prefix, 'stale')
+                return self.page_cache_response(entry, 'stale')
+
+        record_page_cache(prefix, 'miss')
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            if response.status_code == 200:
+                cache.set(key, {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'generation': generation,
+                    'expires': time.time() + self.page_cache_timeout,
+                }, PAGE_CACHE_STALE_TIMEOUT)
+        finally:
+            if locked:
+                # expire rather than delete: a TwoTierCache delete bumps the
+                # generation and flushes every process's local tier
+                cache.touch(key + ':lock', 0)
+        response['X-Page-Cache'] = 'miss'
+        return response
@@ -0,0 +1,145 @@
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# 1.234.567,-  1.234.567,50  Rp 1.234.567  -1234
+AMOUNT_RE = re.compile(r'(-)?(?:Rp\.?)?(-)?(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d+|-))?', re.IGNORECASE)
+
+EMPTY_VALUES = (None, '')
+
+# two-digit years: 69-99 are 19xx, 00-68 are 20xx (as strptime's %y)
+YEAR_PIVOT = 69
+
+
+def dot_as_decimal_point(text, always=False):
+    # A lone dot is a thousands separator only when exactly three digits
+    # follow it (1.500); 1.5 and 2500.75 are decimals.
+    if text.count('.') != 1 or ',' in text:
+        return text
+    dot = text.index('.')
+    if not text[dot - 1:dot].isdigit():
+        # the dot of 'Rp.'
+        return text
+    if always or len(text) - dot - 1 != 3:
+        return text.replace('.', ',')
+    return text
+
+
+def parse_amount(value, dot_decimal=False):
+    if isinstance(value, (int, Decimal)):
+        return Decimal(value)
+    if isinstance(value, float):
+        return Decimal(str(value))
+    # str.replace is much cheaper than str.translate for this
+    text = dot_as_decimal_point(str(value).replace(' ', '').replace('\u00a0', ''), always=dot_decimal)
+    match = AMOUNT_RE.fullmatch(text)
+    if match is None:
+        raise ValueError('Invalid amount')
+    minus, minus_after_currency, digits, decimals = match.groups()
+    amount = Decimal(digits.replace('.', '') + ('.' + decimals if decimals and decimals != '-' else ''))
+    return -amount if minus or minus_after_currency else amount
+
+
+def parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        day, month, year = str(value).strip().replace('-', '/').replace('.', '/').split('/')
+        if len(year) == 2:
+            year = int(year) + (1900 if int(year) >= YEAR_PIVOT else 2000)
+        elif len(year) != 4:
+            raise ValueError
+        return datetime.date(int(year), int(month), int(day))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid date, expected DD/MM/YYYY')
+
+
+def parse_percentage(value):
+    if isinstance(value, str):
+        value = value.strip().rstrip('%')
+    try:
+        # percentages never need a thousands separator, so 0.125 is a decimal
+        return parse_amount(value, dot_decimal=True) / 100
+    except (ValueError, InvalidOperation):
+        raise ValueError('Invalid percentage')
+
+
+PARSERS = {
+    'amount': parse_amount,
+    'date': parse_date,
+    'percentage': parse_percentage,
+}
+
+
+def parse_column(values, kind, required=False):
+    """
+    Parse a whole spreadsheet column. Returns ``(parsed, errors)`` where
+    ``errors`` maps the row index to a message; bad and empty cells become
+    None. Each distinct cell text is parsed once, which is where most of the
+    time goes on real sheets (repeated dates, round amounts).
+    """
+    parser = PARSERS[kind]
+    seen = {}
+    parsed = []
+    errors = {}
+    for row, value in enumerate(values):
+        if isinstance(value, str):
+            value = value.strip()
+        if value in EMPTY_VALUES:
+            if required:
+                errors[row] = 'This field is required.'
+            parsed.append(None)
+            continue
+        try:
+            result = seen[value]
+        except (KeyError, TypeError):
+            try:
+                result = parser(value)
+            except (ValueError, InvalidOperation) as e:
+                result = e
+            try:
+                seen[value] = result
+            except TypeError:
+                pass
+        if isinstance(result, Exception):
+            errors[row] = str(result)
+            result = None
+        parsed.append(result)
+    return parsed, errors
+
+
+def as_array(parsed, kind):
+    """
+    NumPy view of a parsed column: float64 (NaN for missing) for amounts and
+    percentages, datetime64[D] (NaT for missing) for dates.
+    """
+    if numpy is None:
+        raise ImportError('NumPy is required for array output')
+    if kind == 'date':
+        return numpy.array([numpy.datetime64('NaT') if value is None else value for value in parsed], dtype='datetime64[D]')
+    return numpy.array([numpy.nan if value is None else value for value in parsed], dtype=numpy.float64)
+
+
+def parse_table(rows, columns, required=(), arrays=False):
+    """
+    ``rows`` is a list of dicts (e.g. from csv.DictReader) and ``columns``
+    maps a header to one of PARSERS. Returns ``(parsed_columns, errors)``
+    with errors as ``(row, header, message)`` tuples in row order.
+    """
+    parsed_columns = {}
+    errors = []
+    for header, kind in columns.items():
+        parsed, column_errors = parse_column(
+            [row.get(header) for row in rows], kind, required=header in required
+        )
+        parsed_columns[header] = as_array(parsed, kind) if arrays else parsed
+        errors.extend((row, header, message) for row, message in column_errors.items())
+    errors.sort()
+    return parsed_columns, errors
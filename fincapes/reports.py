@@ -0,0 +1,119 @@
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, F, Func, IntegerField, Subquery
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from fincapes.timezones import as_zone, get_user_timezone
+
+# metric -> (model, date field, filters)
+REPORT_METRICS = {
+    'users_joined': ('accounts.User', 'timestamp', {}),
+    # by first publication, which never changes once set; bucketing by creation
+    # date with the current status would rewrite closed, cached months
+    'content_published': ('contents.Content', 'published', {}),
+    # by activation time, set once; 'update' is auto_now and moves on every save
+    'activations_completed': ('accounts.EmailActivation', 'activated_at', {}),
+}
+
+
+def get_report_timezone(user=None):
+    return get_user_timezone(user)
+
+
+def month_start(date, months=0):
+    month = date.year * 12 + date.month - 1 + months
+    return date.replace(year=month // 12, month=month % 12 + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def month_ranges(months_ago=1, include_this_month=False, tzinfo=None, now=None):
+    """
+    Same months as fincapes.utils.get_month_data_range, as aware [start, end)
+    pairs in ``tzinfo`` (default: the active timezone), oldest first.
+    """
+    tzinfo = as_zone(tzinfo)
+    this_month = month_start((now or timezone.now()).astimezone(tzinfo))
+    first = -months_ago
+    last = 1 if include_this_month else 0
+    ranges = []
+    for offset in range(first, last):
+        start = month_start(this_month, offset)
+        ranges.append((start, month_start(start, 1)))
+    return ranges
+
+
+def report_cache_key(metric, tzinfo, start):
+    # str() names ZoneInfo, pytz and datetime.timezone zones alike; only
+    # ZoneInfo has .key
+    return 'report:{}:{}:{:%Y-%m}'.format(metric, tzinfo, start)
+
+
+def month_label(start):
+    return '{:%Y-%m}'.format(start)
+
+
+def grouped_by_month(queryset, field, ranges, tzinfo, truncate=None):
+    """
+    Count rows per month of ``ranges`` in one query. TruncMonth groups in the
+    database, except on SQLite where it converts every row through a Python
+    function; there each month is an indexed COUNT subquery instead.
+    """
+    if truncate is None:
+        truncate = connections[queryset.db].vendor != 'sqlite'
+    if not truncate:
+        months = {
+            f'month_{i}': Subquery(
+                queryset.filter(**{f'{field}__gte': start, f'{field}__lt': end}).order_by()
+                .annotate(count=Func(F('pk'), function='Count')).values('count'),
+                output_field=IntegerField()
+            )
+            for i, (start, end) in enumerate(ranges)
+        }
+        counts = queryset.order_by().annotate(**months).values(*months).first() or {}
+        return {month_label(start): counts.get(f'month_{i}', 0) for i, (start, end) in enumerate(ranges)}
+    rows = queryset.filter(**{f'{field}__gte': ranges[0][0], f'{field}__lt': ranges[-1][1]}).annotate(
+        report_month=TruncMonth(field, tzinfo=tzinfo)
+    ).values('report_month').annotate(value=Count('pk')).order_by()
+    return {month_label(row['report_month'].astimezone(tzinfo)): row['value'] for row in rows}
+
+
+def monthly_report(metric, months_ago=12, include_this_month=True, tzinfo=None, now=None):
+    """
+    Per-month counts of a REPORT_METRICS entry in one grouped query. Closed
+    months are cached without expiry, so usually only the current month is
+    counted again. ``tzinfo`` defaults to the active timezone, i.e. the
+    user's inside a request.
+    """
+    model, field, filters = REPORT_METRICS[metric]
+    tzinfo = as_zone(tzinfo)
+    now = now or timezone.now()
+    ranges = month_ranges(months_ago, include_this_month, tzinfo, now)
+    keys = [report_cache_key(metric, tzinfo, start) for start, end in ranges]
+    cached = cache.get_many([key for key, (start, end) in zip(keys, ranges) if end <= now])
+
+    missing = [(start, end) for key, (start, end) in zip(keys, ranges) if key not in cached]
+    values = {}
+    if missing:
+        queryset = apps.get_model(model)._default_manager.filter(**filters)
+        values = grouped_by_month(queryset, field, missing, tzinfo)
+        cache.set_many({
+            key: values.get(month_label(start), 0)
+            for key, (start, end) in zip(keys, ranges) if end <= now and key not in cached
+        }, None)
+
+    report = []
+    for key, (start, end) in zip(keys, ranges):
+        value = cached[key] if key in cached else values.get(month_label(start), 0)
+        report.append({
+            'start': start,
+            'end': end,
+            'year': start.year,
+            'month': start.strftime('%B'),
+            'closed': end <= now,
+            'value': value,
+        })
+    return report
+
+
+def monthly_reports(metrics=None, **kwargs):
+    return {metric: monthly_report(metric, **kwargs) for metric in metrics or REPORT_METRICS}
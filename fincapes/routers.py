@@ -0,0 +1,66 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Set once the current request (or task) has written to the primary, so its
+# later reads do not hit a replica that may not have the write yet.
+_pinned = ContextVar('fincapes_db_pinned', default=False)
+
+
+def pin_primary():
+    _pinned.set(True)
+
+
+def unpin_primary():
+    _pinned.set(False)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+@contextmanager
+def use_primary():
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+# Cache entries and sessions must never be read behind their own writes.
+PRIMARY_ONLY_APPS = {'django_cache', 'sessions'}
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        if is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # cache and session writes are on most requests and never read from
+        # a replica, pinning on them would send every later read to the primary
+        if model._meta.app_label not in PRIMARY_ONLY_APPS:
+            pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,16 +52,19 @@ INSTALLED_APPS = [
     
     'accounts',
     'contents',
+    'currencies',
     'landing'
 ]
 
 MIDDLEWARE = [
+    'fincapes.middleware.PrimaryPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'fincapes.middleware.DefaultLanguageMiddleware',
+    'fincapes.middleware.TimezoneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_user_agents.middleware.UserAgentMiddleware',
@@ -87,6 +90,9 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'libraries': {
+                'fincapes_tags': 'fincapes.templatetags.fincapes_tags',
+            },
         },
     },
 ]
@@ -99,17 +105,52 @@ WSGI_APPLICATION = 'fincapes.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 with WAL and connection pragmas, see fincapes.db.sqlite3
+        'ENGINE': 'fincapes.db.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas, e.g. DATABASE_REPLICAS=/srv/replica1.sqlite3,/srv/replica2.sqlite3
+# Reads go to a replica until the request writes, then stay on the primary.
+DATABASE_REPLICAS = []
+for num, replica_name in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), start=1):
+    alias = 'replica%s' % num
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': replica_name,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['fincapes.routers.PrimaryReplicaRouter']
+
+# Per-process LRU in front of the shared database cache, see fincapes.cache
 CACHES = {
     'default': {
+        'BACKEND': 'fincapes.cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+        },
+    },
+    'select2': {
+        'BACKEND': 'fincapes.cache.TwoTierCache',
+        'LOCATION': 'select2_shared',
+        'TIMEOUT': 7200,
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': 500,
+            'LOCAL_TIMEOUT': 60,
+        },
+    },
+    'shared': {
         'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
         'LOCATION': 'default_cache',
     },
-    'select2': {
+    'select2_shared': {
         'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
         'LOCATION': 'select2_cache',
         'TIMEOUT': 7200,
@@ -217,4 +258,8 @@ THUMBNAILS = {
     }
 }
 
+# Thumbnails of pregenerated_sizes are queued here and rendered by
+# `django-admin thumbnail_worker`, see fincapes.images
+THUMBNAIL_QUEUE_DIR = BASE_DIR / 'cdn/queue/thumbnails'
+
 THUMB_SIZE = (100, 100)
\ No newline at end of file
@@ -0,0 +1,46 @@
+from django import template
+from fincapes.formatters import get_active_formatter
+from fincapes.helpers import get_date_human
+from fincapes.images import image_srcset, responsive_picture, thumbnail_url
+
+register = template.Library()
+
+
+@register.filter
+def human_date(value, locale=None):
+    return get_date_human(value, locale=locale) or ''
+
+
+@register.filter
+def currency(value, language=None):
+    if value in (None, ''):
+        return ''
+    try:
+        return get_active_formatter(language).currency(value)
+    except (TypeError, ValueError):
+        return ''
+
+
+@register.filter
+def locale_date(value, language=None):
+    return get_active_formatter(language).date(value) if value else ''
+
+
+@register.filter
+def full_date(value, day_name=False):
+    return get_active_formatter().full_date(value, day_name=day_name) if value else ''
+
+
+@register.filter
+def thumbnail(image, size):
+    return thumbnail_url(image, size)
+
+
+@register.simple_tag
+def picture(image, sizes='100vw', alt='', css_class=''):
+    return responsive_picture(image, sizes=sizes, alt=alt, css_class=css_class)
+
+
+@register.simple_tag
+def srcset(image, fmt='webp'):
+    return image_srcset(image, fmt) if image else ''
@@ -0,0 +1,387 @@
+import csv
+import datetime
+import json
+import zipfile
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock, skipUnless
+from zoneinfo import ZoneInfo
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from accounts.models import EmailActivation, User
+from contents.models import Category, Content
+from fincapes.cache import GENERATION_KEY
+from django.template import Context, Template
+from django.utils import timezone, translation
+from fincapes import formatters
+from fincapes.helpers import DatatableView, check_date_valid, datatable_count_key, get_locale_date, get_locale_full_date, is_number
+from fincapes.parsers import numpy, parse_amount, parse_date, parse_percentage, parse_table
+from fincapes.middleware import PrimaryPinningMiddleware
+from fincapes.reports import grouped_by_month, month_ranges, monthly_report
+from fincapes.routers import PrimaryReplicaRouter, unpin_primary
+from fincapes.utils import currency
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'fincapes.cache.TwoTierCache',
+        'LOCATION': 'shared_test',
+        'OPTIONS': {'LOCAL_MAX_ENTRIES': 2, 'CHECK_INTERVAL': 0},
+    },
+    'shared_test': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-test',
+    },
+})
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.cache.local.stats.update(local_hits=0, shared_hits=0, misses=0)
+
+    def test_reads_are_served_locally(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        caches['shared_test'].delete('key')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get('other', 'default'), 'default')
+        stats = self.cache.hit_ratios()
+        self.assertEqual((stats['local_hits'], stats['misses']), (2, 1))
+
+    def test_local_tier_is_bounded(self):
+        self.cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(len(self.cache.local.data), 2)
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(self.cache.hit_ratios()['shared_hits'], 1)
+
+    def test_generation_change_drops_local_tier(self):
+        self.cache.set('key', 'value')
+        # another process writes the key and bumps the generation
+        caches['shared_test'].set('key', 'changed')
+        caches['shared_test'].set(GENERATION_KEY, 0, None)
+        self.assertEqual(self.cache.get('key'), 'changed')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        unpin_primary()
+        self.addCleanup(unpin_primary)
+
+    def test_reads_stick_to_primary_after_write(self):
+        self.assertEqual(self.router.db_for_read(Content), 'replica1')
+        self.assertEqual(self.router.db_for_write(Content), 'default')
+        self.assertEqual(self.router.db_for_read(Content), 'default')
+
+    def test_pin_is_reset_per_request(self):
+        middleware = PrimaryPinningMiddleware(lambda request: HttpResponse())
+        self.router.db_for_write(Content)
+        middleware(RequestFactory().get('/'))
+        self.assertEqual(self.router.db_for_read(Content), 'replica1')
+
+    def test_sessions_read_from_primary(self):
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+
+    def test_session_writes_do_not_pin(self):
+        self.assertEqual(self.router.db_for_write(Session), 'default')
+        self.assertEqual(self.router.db_for_read(Content), 'replica1')
+
+
+class CategoryDatatableView(DatatableView):
+    model = Category
+    keyset_pagination = True
+    column_defs = [
+        {'name': 'pk', 'visible': False},
+        {'name': 'name', 'title': 'Name', 'orderable': True, 'searchable': True},
+    ]
+
+
+class ContentDatatableView(DatatableView):
+    model = Content
+    keyset_pagination = True
+    column_defs = [
+        {'name': 'pk', 'visible': False},
+        {'name': 'title', 'orderable': True, 'searchable': True},
+    ]
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class KeysetDatatableTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Category.objects.bulk_create([Category(name=f'category-{i:02d}') for i in range(25)])
+        self.view = CategoryDatatableView.as_view()
+
+    def draw(self, start, cursor='', search='', view=None, column='name', direction='desc'):
+        request = RequestFactory().get('/', {
+            'draw': 1, 'start': start, 'length': 10, 'cursor': cursor,
+            'columns[0][name]': 'pk', 'columns[1][name]': column,
+            'columns[1][searchable]': 'true', 'columns[1][orderable]': 'true',
+            'order[0][column]': 1, 'order[0][dir]': direction, 'search[value]': search,
+        }, HTTP_ACCEPT='application/json')
+        return json.loads((view or self.view)(request).content)
+
+    def test_pages_are_read_by_seek_with_cached_counts(self):
+        first = self.draw(0)
+        self.assertEqual(first['data'][0]['name'], 'category-24')
+        self.assertEqual((first['recordsTotal'], first['recordsFiltered']), (25, 25))
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.draw(10, first['cursor'])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[-1]['sql'].upper())
+        self.assertNotIn('OFFSET', queries[-1]['sql'].upper())
+        self.assertEqual([row['name'] for row in second['data']], [f'category-{i:02d}' for i in range(14, 4, -1)])
+
+        # a jump without a matching cursor still works through OFFSET
+        self.assertEqual(self.draw(20)['data'][-1]['name'], 'category-00')
+        self.assertEqual(self.draw(10, first['cursor'] + 'x')['data'], second['data'])
+
+    def test_seek_breaks_ties_on_pk(self):
+        Content.objects.bulk_create([Content(title=f'Title {i % 3}') for i in range(25)])
+        view = ContentDatatableView.as_view()
+        expected = list(Content.objects.order_by('-title', '-pk').values_list('pk', flat=True))
+        seen, cursor = [], ''
+        for start in (0, 10, 20):
+            result = self.draw(start, cursor, view=view, column='title')
+            seen += [int(row['pk']) for row in result['data']]
+            cursor = result['cursor']
+        self.assertEqual(seen, expected)
+
+    def test_seek_keeps_rows_with_null_sort_values(self):
+        Content.objects.bulk_create([Content(title=f'Title {i:02d}' if i % 3 else None) for i in range(25)])
+        view = ContentDatatableView.as_view()
+        for direction in ('asc', 'desc'):
+            seen, cursor = [], ''
+            for start in (0, 10, 20):
+                result = self.draw(start, cursor, view=view, column='title', direction=direction)
+                seen += [int(row['pk']) for row in result['data']]
+                cursor = result.get('cursor') or ''
+            self.assertEqual(result['recordsFiltered'], 25)
+            self.assertEqual(sorted(seen), sorted(Content.objects.values_list('pk', flat=True)))
+
+    def export(self, fmt):
+        request = RequestFactory().get('/', {
+            'action': 'export', 'format': fmt, 'search[value]': 'category-1',
+            'columns[0][name]': 'pk', 'columns[1][name]': 'name',
+            'columns[1][searchable]': 'true', 'columns[1][orderable]': 'true',
+            'order[0][column]': 1, 'order[0][dir]': 'desc',
+        })
+        return self.view(request)
+
+    def test_export_applies_filters_and_order(self):
+        response = self.export('csv')
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['Name'])
+        self.assertEqual([row[0] for row in rows[1:]], [f'category-{i:02d}' for i in range(19, 9, -1)])
+
+        response = self.export('xlsx')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as workbook:
+            self.assertIn('xl/worksheets/sheet1.xml', workbook.namelist())
+        self.assertEqual(self.export('pdf').status_code, 400)
+
+    def test_posted_draws_stay_csrf_exempt(self):
+        self.assertTrue(CategoryDatatableView.as_view().csrf_exempt)
+
+    def test_saves_invalidate_before_any_request(self):
+        # no draw has been served in this test; defining the view connected the receivers
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='category-new')
+        self.assertIsNotNone(cache.get(datatable_count_key(Category, 'generation')))
+
+    def test_streamed_export_keeps_request_timezone(self):
+        class TimestampTable(ContentDatatableView):
+            column_defs = ContentDatatableView.column_defs + [{'name': 'timestamp', 'title': 'Time'}]
+
+        content = Content.objects.create(title='Late')
+        Content.objects.filter(pk=content.pk).update(timestamp=datetime.datetime(2024, 3, 1, 20, tzinfo=datetime.timezone.utc))
+        request = RequestFactory().get('/', {
+            'action': 'export', 'format': 'csv', 'columns[0][name]': 'pk',
+            'columns[1][name]': 'title', 'columns[2][name]': 'timestamp',
+        })
+        with timezone.override('Asia/Jakarta'):
+            response = TimestampTable.as_view()(request)
+        # consumed after the middleware has deactivated the user's timezone
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertIn('03:00', rows[1][1])
+
+    def test_counts_are_invalidated_on_save(self):
+        self.assertEqual(self.draw(0, search='category-1')['recordsFiltered'], 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='category-1x')
+        result = self.draw(0, search='category-1')
+        self.assertEqual((result['recordsTotal'], result['recordsFiltered']), (26, 11))
+
+    def test_totals_are_kept_per_initial_queryset(self):
+        class FewCategories(CategoryDatatableView):
+            def get_initial_queryset(self, request=None):
+                return Category.objects.filter(name__lt='category-02')
+
+        class NoCategories(CategoryDatatableView):
+            def get_initial_queryset(self, request=None):
+                return Category.objects.none()
+
+        few = self.draw(0, view=FewCategories.as_view())
+        self.assertEqual((few['recordsTotal'], few['recordsFiltered']), (2, 2))
+        self.assertEqual(self.draw(0)['recordsTotal'], 25)
+        empty = self.draw(0, view=NoCategories.as_view())
+        self.assertEqual((empty['recordsTotal'], empty['recordsFiltered'], empty['data']), (0, 0, []))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class MonthlyReportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tzinfo = ZoneInfo('Asia/Jakarta')
+        self.now = datetime.datetime(2024, 3, 15, tzinfo=self.tzinfo)
+        # 1 Feb 01:00 in Jakarta is still January in UTC
+        joined = [
+            datetime.datetime(2024, 1, 10, tzinfo=self.tzinfo),
+            datetime.datetime(2024, 2, 1, 1, tzinfo=self.tzinfo),
+            datetime.datetime(2024, 2, 20, tzinfo=self.tzinfo),
+            datetime.datetime(2024, 3, 1, tzinfo=self.tzinfo),
+        ]
+        for i, timestamp in enumerate(joined):
+            user = User.objects.create_user(f'user{i}@fincapes.com', first_name='User')
+            User.objects.filter(pk=user.pk).update(timestamp=timestamp)
+
+    def report(self):
+        return monthly_report('users_joined', months_ago=3, tzinfo=self.tzinfo, now=self.now)
+
+    def test_months_are_grouped_in_one_query(self):
+        with self.assertNumQueries(1):
+            report = self.report()
+        self.assertEqual([(row['month'], row['value']) for row in report], [
+            ('December', 0), ('January', 1), ('February', 2), ('March', 1),
+        ])
+        self.assertEqual([row['closed'] for row in report], [True, True, True, False])
+
+    def test_truncmonth_grouping_matches(self):
+        ranges = month_ranges(3, True, self.tzinfo, self.now)
+        self.assertEqual(
+            grouped_by_month(User.objects.all(), 'timestamp', ranges, self.tzinfo, truncate=True),
+            {'2024-01': 1, '2024-02': 2, '2024-03': 1},
+        )
+
+    def test_content_counted_in_month_first_published(self):
+        draft = Content.objects.create(title='Draft')
+        Content.objects.filter(pk=draft.pk).update(timestamp=datetime.datetime(2024, 1, 5, tzinfo=self.tzinfo))
+        draft.status = 1
+        with mock.patch('django.utils.timezone.now', return_value=datetime.datetime(2024, 2, 10, tzinfo=self.tzinfo)):
+            draft.save()
+        counts = lambda: [row['value'] for row in monthly_report(
+            'content_published', months_ago=3, tzinfo=self.tzinfo, now=self.now
+        )]
+        self.assertEqual(counts(), [0, 0, 1, 0])
+        draft.status = 0
+        draft.save()
+        cache.clear()
+        self.assertEqual(counts(), [0, 0, 1, 0])
+
+    def test_activations_counted_in_month_activated(self):
+        user = User.objects.get(email='user0@fincapes.com')
+        activation = EmailActivation.objects.create(user=user, email=user.email)
+        activation.activated = True
+        with mock.patch('django.utils.timezone.now', return_value=datetime.datetime(2024, 1, 20, tzinfo=self.tzinfo)):
+            activation.save()
+        counts = lambda: [row['value'] for row in monthly_report(
+            'activations_completed', months_ago=3, tzinfo=self.tzinfo, now=self.now
+        )]
+        self.assertEqual(counts(), [0, 1, 0, 0])
+        # a later save touches 'update' but not the month it was activated in
+        activation.save()
+        cache.clear()
+        self.assertEqual(counts(), [0, 1, 0, 0])
+
+    def test_defaults_to_the_active_timezone(self):
+        with timezone.override('America/Toronto'):
+            report = monthly_report('users_joined', months_ago=3, now=self.now)
+        self.assertEqual(str(report[0]['start'].tzinfo), 'America/Toronto')
+        # 1 Feb 01:00 and 1 Mar 00:00 in Jakarta are a month earlier in Toronto
+        self.assertEqual([row['value'] for row in report], [0, 2, 2, 0])
+
+    def test_fixed_offset_zones(self):
+        report = monthly_report('users_joined', months_ago=3, tzinfo=datetime.timezone.utc, now=self.now)
+        self.assertEqual(len(report), 4)
+
+    def test_only_the_current_month_is_recounted(self):
+        self.report()
+        User.objects.filter(email='user0@fincapes.com').update(timestamp=datetime.datetime(2024, 3, 2, tzinfo=self.tzinfo))
+        with CaptureQueriesContext(connection) as queries:
+            report = self.report()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([row['value'] for row in report], [0, 1, 2, 2])
+
+
+class ColumnParserTest(SimpleTestCase):
+    def test_amounts_dates_and_percentages(self):
+        rows = [
+            {'amount': '1.234.567,-', 'date': '17/08/2024', 'rate': '12,5%'},
+            {'amount': 'Rp 2.500,75', 'date': '01-02-2024', 'rate': '3'},
+            {'amount': '-1234', 'date': '31/02/2024', 'rate': 'abc'},
+            {'amount': '1.23.4', 'date': '', 'rate': '12,5%'},
+        ]
+        columns, errors = parse_table(rows, {'amount': 'amount', 'date': 'date', 'rate': 'percentage'}, required=('date',))
+        self.assertEqual(columns['amount'], [Decimal('1234567'), Decimal('2500.75'), Decimal('-1234'), None])
+        self.assertEqual(columns['date'], [datetime.date(2024, 8, 17), datetime.date(2024, 2, 1), None, None])
+        self.assertEqual(columns['rate'], [Decimal('0.125'), Decimal('0.03'), None, Decimal('0.125')])
+        self.assertEqual([(row, header) for row, header, message in errors], [
+            (2, 'date'), (2, 'rate'), (3, 'amount'), (3, 'date'),
+        ])
+
+    def test_dot_decimals_and_short_years(self):
+        self.assertEqual(parse_percentage('0.125'), Decimal('0.00125'))
+        self.assertEqual(parse_percentage('12.5%'), Decimal('0.125'))
+        self.assertEqual(parse_amount('1.5'), Decimal('1.5'))
+        self.assertEqual(parse_amount('2500.75'), Decimal('2500.75'))
+        self.assertEqual(parse_amount('1.500'), Decimal('1500'))
+        self.assertEqual(parse_amount('Rp.1500'), Decimal('1500'))
+        self.assertEqual(parse_date('17/08/24'), datetime.date(2024, 8, 17))
+        self.assertEqual(parse_date('17/08/85'), datetime.date(1985, 8, 17))
+        with self.assertRaises(ValueError):
+            parse_date('17/08/024')
+
+    @skipUnless(numpy, 'NumPy is not installed')
+    def test_array_output(self):
+        columns, errors = parse_table([{'amount': '1.000,5'}, {'amount': 'x'}], {'amount': 'amount'}, arrays=True)
+        self.assertEqual(columns['amount'].dtype, numpy.float64)
+        self.assertEqual(columns['amount'][0], 1000.5)
+        self.assertTrue(numpy.isnan(columns['amount'][1]))
+
+    def test_is_number_rejects_text(self):
+        self.assertFalse(is_number('abc'))
+        self.assertTrue(is_number('1.5'))
+        self.assertEqual(check_date_valid('2024-01-01'), (False, None))
+
+
+class LocaleFormatterTest(SimpleTestCase):
+    def test_matches_pendulum_patterns(self):
+        import pendulum
+        for day in (datetime.date(2024, 1, 5), datetime.date(2023, 12, 31), datetime.date(2024, 8, 17)):
+            for language in ('id', 'en'):
+                with translation.override(language):
+                    expected = pendulum.date(day.year, day.month, day.day)
+                    self.assertEqual(get_locale_date(day), expected.format('DD/MM/YYYY' if language == 'id' else 'MM/DD/YYYY'))
+                    self.assertEqual(get_locale_full_date(day, True), expected.format('dddd DD MMMM YYYY', locale=language))
+        self.assertEqual(currency(1234567.9), '1.234.567,-')
+        self.assertEqual(currency(-1234567, lang='en'), '-1,234,567.-')
+        self.assertEqual(formatters.get_formatter('xx').full_date(datetime.date(2024, 1, 5)), '05 January 2024')
+
+    def test_filters_use_active_formatter(self):
+        template = Template(
+            '{% load fincapes_tags %}{{ amount|currency }} {{ day|locale_date }} {{ day|full_date }} {{ amount|currency:"en" }}'
+        )
+        context = Context({'amount': Decimal('2500000'), 'day': datetime.date(2024, 5, 1)})
+        with translation.override('id'):
+            rendered = template.render(context)
+        with translation.override('en'):
+            overridden = template.render(context)
+        self.assertEqual(rendered, '2.500.000,- 01/05/2024 01 Mei 2024 2,500,000.-')
+        self.assertEqual(overridden, '2,500,000.- 05/01/2024 01 May 2024 2,500,000.-')
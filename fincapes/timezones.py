@@ -0,0 +1,136 @@
+import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, Count, DateField, F, Func, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+DEFAULT_USER_TIMEZONE = getattr(settings, 'DEFAULT_USER_TIMEZONE', 'Asia/Jakarta')
+
+
+@lru_cache(maxsize=None)
+def get_zone(name=None):
+    # missing and unknown names both get DEFAULT_USER_TIMEZONE
+    try:
+        return ZoneInfo(name or DEFAULT_USER_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_USER_TIMEZONE)
+
+
+def as_zone(tzinfo=None):
+    """
+    ``tzinfo`` as a tzinfo object: a zone name, a tzinfo (returned as is) or
+    None for the active timezone.
+    """
+    if tzinfo is None:
+        return timezone.get_current_timezone()
+    if isinstance(tzinfo, str):
+        return get_zone(tzinfo)
+    return tzinfo
+
+
+def get_user_timezone(user=None):
+    name = None
+    if user is not None and user.is_authenticated:
+        profile = getattr(user, 'profile', None)
+        name = getattr(profile, 'timezone', None)
+    return get_zone(name)
+
+
+def local_day_range(date, tzinfo=None):
+    """Aware ``[start, end)`` of a local calendar day, for index-friendly filters."""
+    tzinfo = as_zone(tzinfo)
+    start = datetime.datetime.combine(date, datetime.time.min, tzinfo)
+    return start, datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time.min, tzinfo)
+
+
+@lru_cache(maxsize=None)
+def offset_segments(tzinfo, first_year=1970, last_year=2100):
+    """
+    ``(start, offset)`` pairs, oldest first, for each span of constant UTC
+    offset of ``tzinfo``; ``start`` is in UTC and None for the first span.
+    """
+    utc = datetime.timezone.utc
+    # no zone changes offset twice within a week
+    week = datetime.timedelta(days=7)
+    moment = datetime.datetime(first_year, 1, 1, tzinfo=utc)
+    end = datetime.datetime(last_year, 1, 1, tzinfo=utc)
+    offset = moment.astimezone(tzinfo).utcoffset()
+    segments = [(None, offset)]
+    while moment < end:
+        following = moment + week
+        next_offset = following.astimezone(tzinfo).utcoffset()
+        if next_offset != offset:
+            low, high = moment, following
+            while high - low > datetime.timedelta(seconds=1):
+                middle = low + (high - low) / 2
+                if middle.astimezone(tzinfo).utcoffset() == offset:
+                    low = middle
+                else:
+                    high = middle
+            segments.append((high.replace(microsecond=0), next_offset))
+            offset = next_offset
+        moment = following
+    return segments
+
+
+def shifted_date(field, offset):
+    return Func(
+        F(field), Value('%+d seconds' % offset.total_seconds()), function='DATE', output_field=DateField()
+    )
+
+
+def segment_search(field, segments):
+    # nested CASE halving the spans, so a row is compared ~log2(spans) times
+    if len(segments) == 1:
+        return shifted_date(field, segments[0][1])
+    middle = len(segments) // 2
+    return Case(
+        When(**{f'{field}__gte': segments[middle][0]}, then=segment_search(field, segments[middle:])),
+        default=segment_search(field, segments[:middle]), output_field=DateField()
+    )
+
+
+def local_date_expression(field, tzinfo, vendor):
+    """
+    TruncDate(field, tzinfo) for the database. SQLite runs TruncDate through a
+    Python function per row, so there the stored UTC value is shifted with its
+    native date() by the zone's offset at that moment instead.
+    """
+    if vendor != 'sqlite':
+        return TruncDate(field, tzinfo=tzinfo)
+    return segment_search(field, offset_segments(tzinfo))
+
+
+class LocalDateQuerySetMixin(object):
+    """
+    Local calendar dates worked out by the database. ``tzinfo`` defaults to
+    the active timezone, i.e. the user's inside a request.
+    """
+    local_date_field = 'timestamp'
+
+    def with_local_date(self, field=None, tzinfo=None, name='local_date'):
+        expression = local_date_expression(
+            field or self.local_date_field, as_zone(tzinfo), connections[self.db].vendor
+        )
+        return self.annotate(**{name: expression})
+
+    def on_local_date(self, date, field=None, tzinfo=None):
+        start, end = local_day_range(date, tzinfo)
+        field = field or self.local_date_field
+        return self.filter(**{f'{field}__gte': start, f'{field}__lt': end})
+
+    def between_local_dates(self, first, last, field=None, tzinfo=None):
+        field = field or self.local_date_field
+        return self.filter(**{
+            f'{field}__gte': local_day_range(first, tzinfo)[0],
+            f'{field}__lt': local_day_range(last, tzinfo)[1],
+        })
+
+    def count_by_local_date(self, field=None, tzinfo=None):
+        rows = self.order_by().with_local_date(field, tzinfo).values('local_date').annotate(
+            count=Count('pk')
+        ).order_by('local_date')
+        return {row['local_date']: row['count'] for row in rows}
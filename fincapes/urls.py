@@ -18,10 +18,12 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
+from fincapes.images import image_variant
 
 urlpatterns = [
     path('', include('landing.urls', namespace='frontpage')),
     path('admin/', admin.site.urls),
+    path('img/<int:width>/<str:fmt>/<path:name>', image_variant, name='image-variant'),
 ]
 
 if settings.DEBUG:
@@ -1,21 +1,24 @@
+import base64
 import datetime
 import os
-import pytz
 import random
 import re
+import secrets
 import string
 from dateutil import parser
+from django.core import signing
 from django.utils.text import slugify
 from django.db.models import Q
+from fincapes.formatters import get_formatter
+from fincapes.timezones import as_zone
 
 
-def get_date_time_local(date_model, tzinfo="Asia/Jakarta"):
-    zone = pytz.timezone(tzinfo)
-    localtime = date_model.astimezone(zone)
-    return localtime
+def get_date_time_local(date_model, tzinfo=None):
+    # tzinfo: a zone name, a tzinfo or None for the active (user's) timezone
+    return date_model.astimezone(as_zone(tzinfo))
 
 
-def last_time_today(date_model, tzinfo="Asia/Jakarta"):
+def last_time_today(date_model, tzinfo=None):
     date_ = get_date_time_local(date_model, tzinfo)
     today = date_.date()
     last_time = datetime.datetime.max.time()
@@ -87,13 +90,10 @@ def get_filename_ext(filepath):
 
 
 def saved_directory_path(instance, filename, root):
-    size = random.randint(3, 5)
-    uid = instance.uid
+    # Uploads are named by their content hash (see fincapes.images.ImageField)
+    # and sharded two levels deep: <root>/ab/cd/abcd....jpg
     name, ext = get_filename_ext(filename)
-    new_str = random_string_generator(size=size)
-    new_filename = "{}{}".format(uid, new_str)
-    final_filename = "{}/{}{}".format(root, new_filename, ext)
-    return final_filename
+    return "{}/{}/{}/{}{}".format(root, name[:2], name[2:4], name, ext.lower())
 
 
 def random_string_generator(size=10, chars=string.ascii_lowercase + string.digits):
@@ -106,55 +106,103 @@ def generate_password(size=8):
     return password
 
 
-def unique_key_generator(instance):
-    size = random.randint(30, 45)
-    key = random.randint(30, 45)
-    Klass = instance.__class__
-    qs_exists = Klass.objects.filter(key=key).exists()
-    if qs_exists:
-        return unique_key_generator(instance)
-    return key
+def unique_key_generator(instance, salt='fincapes.activation'):
+    # The key is a signed "<user>:<nonce>" token carrying its own issue time,
+    # so it never has to be checked against the table for uniqueness.
+    value = '{}:{}'.format(instance.user_id, secrets.token_urlsafe(8))
+    return signing.TimestampSigner(salt=salt).sign(value)
 
 
-def unique_slug_generator(instance, new_slug=None):
-    if new_slug is not None:
-        slug = new_slug
-    else:
-        if instance.title:
-            slug = slugify(instance.title)
-        else:
-            slug = random_string_generator(size=20)
+def check_key_valid(key, max_age=None, salt='fincapes.activation'):
+    if not key:
+        return None
+    try:
+        return signing.TimestampSigner(salt=salt).unsign(key, max_age=max_age)
+    except signing.BadSignature:
+        return None
+
+
+def slug_base(value, max_length=50):
+    slug = slugify(value) if value else ''
+    if not slug:
+        slug = random_string_generator(size=20)
+    # leave room for the "-<n>" suffix added on a collision
+    return slug[:max_length - 8].strip('-')
 
-    Klass = instance.__class__
-    qs_exists = Klass.objects.filter(slug=slug).filter(
-        ~Q(slug=instance.slug)
-    ).exists()
 
-    if qs_exists:
-        new_slug = "{}-{}".format(
-            slug, random_string_generator(size=6)
-        )
-        return unique_slug_generator(instance, new_slug=new_slug)
+def next_free_slug(base, taken):
+    if base not in taken:
+        return base
+    num = 2
+    while "{}-{}".format(base, num) in taken:
+        num += 1
+    return "{}-{}".format(base, num)
 
-    return slug
 
+def unique_slug_generator(instance, new_slug=None, field='slug', source='title'):
+    max_length = instance._meta.get_field(field).max_length
+    value = new_slug if new_slug is not None else getattr(instance, source)
+    current = getattr(instance, field)
+    if current and not value:
+        return current
+
+    base = slug_base(value, max_length)
+    if current and re.fullmatch(r"{}(-\d+)?".format(re.escape(base)), current):
+        return current
 
-def unique_id_generator(instance):
-    size = random.randint(40, 45)
-    new_id = random_string_generator(size=size)
     Klass = instance.__class__
-    qs_exists = Klass.objects.filter(uid=new_id).exists()
-    if qs_exists:
-        return unique_slug_generator(instance)
-    return new_id
+    taken = set(
+        Klass._default_manager.filter(
+            **{'{}__startswith'.format(field): base}
+        ).exclude(pk=instance.pk).values_list(field, flat=True)
+    )
+    return next_free_slug(base, taken)
+
+
+def assign_unique_slugs(objs, field='slug', source='title', chunk_size=500):
+    pending = [obj for obj in objs if not getattr(obj, field)]
+    if not pending:
+        return objs
+    Klass = pending[0].__class__
+    max_length = Klass._meta.get_field(field).max_length
+    bases = [slug_base(getattr(obj, source), max_length) for obj in pending]
+
+    taken = set()
+    distinct = list(set(bases))
+    for i in range(0, len(distinct), chunk_size):
+        lookup = Q()
+        for base in distinct[i:i + chunk_size]:
+            lookup |= Q(**{'{}__startswith'.format(field): base})
+        taken.update(Klass._default_manager.filter(lookup).values_list(field, flat=True))
+
+    for obj, base in zip(pending, bases):
+        slug = next_free_slug(base, taken)
+        taken.add(slug)
+        setattr(obj, field, slug)
+    return objs
+
+
+def unique_id_generator(instance=None, size=40):
+    # 5 bits of entropy per character from the system CSPRNG: a 40 character
+    # uid carries 200 bits, so collisions are never checked against the table.
+    nbytes = -(-size * 5 // 8)
+    token = base64.b32encode(secrets.token_bytes(nbytes)).decode('ascii')
+    return token[:size].lower()
+
+
+def unique_id_batch(count, size=40):
+    return [unique_id_generator(size=size) for _ in range(count)]
+
+
+def assign_unique_ids(objs, field='uid', size=40):
+    pending = [obj for obj in objs if not getattr(obj, field)]
+    for obj, uid in zip(pending, unique_id_batch(len(pending), size=size)):
+        setattr(obj, field, uid)
+    return objs
 
 
 def currency(amount, lang='id'):
-    cur = round(int(amount))
-    separator = ',' if lang == 'id' else '.'
-    separator_ = '.' if lang == 'id' else ','
-    dec = ',-' if lang == 'id' else '.-'
-    return '{:,}'.format(cur).replace(separator, separator_) + dec
+    return get_formatter(lang).currency(amount)
 
 
 def year_list(years=5):
@@ -1,3 +1,15 @@
-from django.db import models
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from contents.models import Content
+from fincapes.mixins import invalidate_page_cache
 
-# Create your models here.
+
+def content_changed_homepage(sender, instance, *args, **kwargs):
+    # After commit: a request rebuilding before then would store the old
+    # content under the new generation, and rolled back saves change nothing.
+    transaction.on_commit(partial(invalidate_page_cache, 'homepage'), using=kwargs.get('using'))
+
+
+post_save.connect(content_changed_homepage, sender=Content)
+post_delete.connect(content_changed_homepage, sender=Content)
@@ -1,3 +1,67 @@
+from django.core.cache import cache, caches
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from contents.models import Content
+from fincapes.cache import GENERATION_KEY
+from fincapes.mixins import get_page_cache_stats, reset_page_cache_stats
 
-# Create your tests here.
+
+class HomepageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_page_cache_stats()
+        self.addCleanup(cache.clear)
+
+    def test_homepage_cached_until_content_changes(self):
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'miss')
+        response = self.client.get('/')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Selamat Datang')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Content.objects.create(title='Article')
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'hit')
+        self.assertEqual(get_page_cache_stats('homepage'), {'hit': 2, 'stale': 0, 'miss': 2})
+
+    def test_invalidated_after_commit(self):
+        self.client.get('/')
+        with self.captureOnCommitCallbacks() as callbacks:
+            Content.objects.create(title='Article')
+            self.assertEqual(self.client.get('/')['X-Page-Cache'], 'hit')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'miss')
+
+    def test_hits_do_not_write_to_the_cache(self):
+        self.client.get('/')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/')['X-Page-Cache'], 'hit')
+        self.assertFalse([q for q in queries if not q['sql'].startswith('SELECT')])
+
+    def test_stale_copy_served_while_rebuilding(self):
+        self.client.get('/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Content.objects.create(title='Article')
+        cache.add('page_cache:homepage:en:full:lock', 1)
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'stale')
+
+    def test_lock_held_by_another_request_is_kept(self):
+        cache.add('page_cache:homepage:en:full:lock', 1)
+        # a cold key rebuilds without taking the lock, it must not release it
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'miss')
+        self.assertIsNotNone(cache.get('page_cache:homepage:en:full:lock'))
+
+    def test_lock_released_without_generation_bump(self):
+        self.client.get('/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Content.objects.create(title='Article')
+        generation = caches['shared'].get(GENERATION_KEY)
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'miss')
+        self.assertIsNone(cache.get('page_cache:homepage:en:full:lock'))
+        self.assertEqual(caches['shared'].get(GENERATION_KEY), generation)
+
+    def test_htmx_requests_cached_separately(self):
+        self.client.get('/')
+        self.assertEqual(self.client.get('/', HTTP_HX_REQUEST='true')['X-Page-Cache'], 'miss')
@@ -1,11 +1,13 @@
 from django.views.generic import TemplateView
 from django.utils.translation import gettext as _
+from fincapes.mixins import PageCacheMixin
 
 
-class HomepageView(TemplateView):
+class HomepageView(PageCacheMixin, TemplateView):
     template_name = 'home-default.html'
+    page_cache_prefix = 'homepage'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["page_title"] = "Selamat Datang" 
+        context["page_title"] = "Selamat Datang"
         return context